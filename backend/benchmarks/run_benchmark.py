@@ -0,0 +1,230 @@
+"""Offline benchmark of the document pipeline.
+
+Generates synthetic PDFs, processes them page by page with `PDFProcessor`,
+ingests the documents through `/ingest` and asks a question through
+`/rag_prompt`, with every model call served by a local stub server. Needs
+Tesseract but no GPU, network or LM Studio.
+
+Run from the `backend` directory:
+
+    python -m benchmarks.run_benchmark --kinds text,scanned --pages 1,10
+
+Every case runs in a fresh process, so its peak RSS is its own. Pass
+`--output` to save the results as JSON and `--baseline` to fail when pages/sec
+regresses against a previous run.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.stub_server import StubLLMServer
+from benchmarks.synthetic_pdfs import KINDS, generate_pdf
+
+
+def run_case(kind: str, num_pages: int, work_dir: str, parallel: bool) -> dict:
+    """Runs one document through processing, ingestion and a RAG prompt.
+
+    Runs in its own process, configured through the environment set up by
+    `main`, since the backend reads its settings when it is imported.
+    """
+    from fastapi.testclient import TestClient
+
+    import main as backend
+    from classes.Metrics import METRICS
+    from classes.PDFProcessor import PDFProcessor
+
+    pdf_path = generate_pdf(
+        kind, num_pages, os.path.join(work_dir, f"{kind}_{num_pages}.pdf")
+    )
+
+    start_time = time.perf_counter()
+    processor = PDFProcessor(pdf_path)
+    documents = []
+    if parallel:
+        for _, page_documents in processor.process_pdf_pages():
+            documents.extend(page_documents)
+    else:
+        for page_number in range(num_pages):
+            _, page_documents = processor.process_pdf_page(page_number)
+            documents.extend(page_documents)
+    process_seconds = time.perf_counter() - start_time
+
+    client = TestClient(backend.app)
+    start_time = time.perf_counter()
+    response = client.post(
+        "/ingest", json={"documents": documents, "doc_id": f"{kind}_{num_pages}"}
+    )
+    response.raise_for_status()
+    ingest_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    response = client.post(
+        "/rag_prompt/",
+        json={
+            "prompt": "What is the total revenue in the report?",
+            "num_docs": 5,
+            "doc_id": f"{kind}_{num_pages}",
+            "use_cache": False,
+        },
+    )
+    response.raise_for_status()
+    rag_seconds = time.perf_counter() - start_time
+
+    summary = METRICS.summary()
+    return {
+        "kind": kind,
+        "pages": num_pages,
+        "documents": len(documents),
+        "process_seconds": round(process_seconds, 3),
+        "pages_per_second": round(num_pages / process_seconds, 3),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "rag_seconds": round(rag_seconds, 3),
+        "stage_seconds": {
+            stage: timing["total_seconds"]
+            for stage, timing in sorted(summary["stages"].items())
+        },
+        "tokens": summary["tokens"],
+        # ru_maxrss is in kilobytes on Linux, children are the page workers
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "peak_children_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def print_results(results: list[dict]) -> None:
+    """Prints the results as a table, one row per case."""
+    stages = sorted({stage for result in results for stage in result["stage_seconds"]})
+    columns = ["kind", "pages", "pages/s", "ingest s", "rag s", "rss MB"] + stages
+    rows = [
+        [
+            result["kind"],
+            str(result["pages"]),
+            f"{result['pages_per_second']:.2f}",
+            f"{result['ingest_seconds']:.2f}",
+            f"{result['rag_seconds']:.2f}",
+            f"{max(result['peak_rss_mb'], result['peak_children_rss_mb']):.0f}",
+        ]
+        + [f"{result['stage_seconds'].get(stage, 0):.2f}" for stage in stages]
+        for result in results
+    ]
+    widths = [
+        max(len(row[idx]) for row in [columns] + rows) for idx in range(len(columns))
+    ]
+    for row in [columns] + rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+
+
+def find_regressions(results: list[dict], baseline: list[dict], tolerance: float):
+    """Returns the cases whose pages/sec dropped by more than `tolerance`."""
+    previous = {(result["kind"], result["pages"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["kind"], result["pages"]))
+        if before and result["pages_per_second"] < before["pages_per_second"] * (
+            1 - tolerance
+        ):
+            regressions.append(
+                f"{result['kind']} x{result['pages']}: "
+                f"{before['pages_per_second']} -> {result['pages_per_second']} pages/s"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--kinds", default=",".join(KINDS), help="Comma-separated document kinds."
+    )
+    parser.add_argument(
+        "--pages", default="1,5,20", help="Comma-separated document sizes in pages."
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Seconds added to every model call."
+    )
+    parser.add_argument(
+        "--token-latency",
+        type=float,
+        default=0.0,
+        help="Seconds added per generated token.",
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Use process_pdf_pages instead of processing one page at a time.",
+    )
+    parser.add_argument("--output", help="Save the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare against a previous JSON output.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed pages/sec drop against the baseline (default: 0.2).",
+    )
+    args = parser.parse_args()
+
+    kinds = args.kinds.split(",")
+    sizes = [int(size) for size in args.pages.split(",")]
+    for kind in kinds:
+        if kind not in KINDS:
+            parser.error(f"Unknown kind {kind!r}, expected one of {', '.join(KINDS)}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir, StubLLMServer(
+        latency=args.latency, token_latency=args.token_latency
+    ) as server:
+        # Point the backend at the stub server and keep every cache and
+        # index out of the real data directory
+        os.environ.update(
+            {
+                "LM_API_URL": server.url,
+                "LM_API_KEY": "benchmark",
+                "LLM_CACHE_PATH": "",
+                "ANSWER_CACHE_TTL": "0",
+                "CHROMA_DIR": os.path.join(work_dir, "chroma"),
+                "BM25_DIR": os.path.join(work_dir, "bm25"),
+                "DOCUMENTS_DIR": os.path.join(work_dir, "documents"),
+                "JOBS_DIR": os.path.join(work_dir, "jobs"),
+                "BLOBS_DIR": os.path.join(work_dir, "blobs"),
+            }
+        )
+
+        for kind in kinds:
+            for num_pages in sizes:
+                with ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                ) as pool:
+                    result = pool.submit(
+                        run_case, kind, num_pages, work_dir, args.parallel
+                    ).result()
+                print(
+                    f"{kind} x{num_pages}: {result['pages_per_second']} pages/s",
+                    file=sys.stderr,
+                )
+                results.append(result)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Dimension of the stub embeddings, the same as nomic-embed-text-v1.5
+EMBEDDING_DIM = 768
+
+
+class StubLLMServer:
+    """A local OpenAI-compatible server standing in for LM Studio.
+
+    Replies are deterministic and cheap to compute, and every request sleeps
+    for `latency` seconds plus `token_latency` seconds per generated token,
+    so benchmarks measure the pipeline rather than the models.
+
+    Translations echo the input (keeping the segment markers of batched
+    translations), summaries keep the first words of each segment, captions
+    and answers are fixed sentences, and embeddings are hashed bags of words.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.05,
+        token_latency: float = 0.0,
+    ):
+        """
+        Initializes the StubLLMServer.
+
+        Args:
+            host (str, optional): Interface to listen on (default: "127.0.0.1").
+            port (int, optional): Port to listen on, 0 picks a free one (default: 0).
+            latency (float, optional): Seconds added to every request (default: 0.05).
+            token_latency (float, optional): Seconds added per generated token (default: 0).
+        """
+        self.latency = latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """The base URL of the API, to be used as `LM_API_URL`."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def chat_reply(self, messages: list[dict]) -> str:
+        """Returns the reply to a chat completion request."""
+        system = next(
+            (m["content"] for m in messages if m["role"] == "system"), ""
+        ).lower()
+        user = messages[-1]["content"]
+
+        if isinstance(user, list):
+            return "A synthetic benchmark image."
+        if "translating" in system:
+            return user
+        if "summariz" in system and "<<<1>>>" in user:
+            # Summarize each segment of a batch under its marker
+            parts = re.split(r"(<<<\d+>>>)", user)
+            return "\n".join(
+                f"{marker}\n{' '.join(segment.split()[:40])}"
+                for marker, segment in zip(parts[1::2], parts[2::2])
+            )
+        if "summariz" in system:
+            return " ".join(user.split()[:40])
+        return "This is a synthetic answer from the benchmark server."
+
+    @staticmethod
+    def embed(text: str) -> list[float]:
+        """Embeds a text as a normalized, hashed bag of words."""
+        vector = [0.0] * EMBEDDING_DIM
+        for word in text.lower().split():
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % EMBEDDING_DIM] += 1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def _sleep(self, completion_tokens: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency + self.token_latency * completion_tokens)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(
+                        {
+                            "object": "list",
+                            "data": [
+                                {"id": model, "object": "model"}
+                                for model in (
+                                    "aya-expanse-8b",
+                                    "llava-v1.5-7b",
+                                    "text-embedding-nomic-embed-text-v1.5-embedding",
+                                )
+                            ],
+                        }
+                    )
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.endswith("/chat/completions"):
+                    self._chat_completion(body)
+                elif self.path.endswith("/embeddings"):
+                    self._embeddings(body)
+                else:
+                    self.send_error(404)
+
+            def _chat_completion(self, body: dict):
+                content = server.chat_reply(body["messages"])
+                prompt_tokens = len(json.dumps(body["messages"])) // 4
+                tokens = content.split(" ")
+                server._sleep(len(tokens))
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens),
+                }
+                response_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+                if not body.get("stream"):
+                    self._send_json(
+                        {
+                            "id": response_id,
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": body["model"],
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": {
+                                        "role": "assistant",
+                                        "content": content,
+                                    },
+                                    "finish_reason": "stop",
+                                }
+                            ],
+                            "usage": usage,
+                        }
+                    )
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                choices = [
+                    {"index": 0, "delta": {"content": f"{token} "}, "finish_reason": None}
+                    for token in tokens
+                ]
+                choices.append({"index": 0, "delta": {}, "finish_reason": "stop"})
+                for choice in choices:
+                    self._send_event(
+                        {
+                            "id": response_id,
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": body["model"],
+                            "choices": [choice],
+                        }
+                    )
+                if body.get("stream_options", {}).get("include_usage"):
+                    self._send_event(
+                        {
+                            "id": response_id,
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": body["model"],
+                            "choices": [],
+                            "usage": usage,
+                        }
+                    )
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def _embeddings(self, body: dict):
+                inputs = body["input"]
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                server._sleep()
+                prompt_tokens = sum(len(text.split()) for text in inputs)
+                self._send_json(
+                    {
+                        "object": "list",
+                        "model": body["model"],
+                        "data": [
+                            {
+                                "object": "embedding",
+                                "index": idx,
+                                "embedding": server.embed(text),
+                            }
+                            for idx, text in enumerate(inputs)
+                        ],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "total_tokens": prompt_tokens,
+                        },
+                    }
+                )
+
+            def _send_json(self, data: dict):
+                payload = json.dumps(data).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_event(self, data: dict):
+                self.wfile.write(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+
+        return Handler
@@ -0,0 +1,162 @@
+import io
+import os
+import random
+
+import fitz
+from PIL import Image, ImageDraw
+
+
+# Kinds of synthetic documents the benchmark can generate
+KINDS = ("text", "scanned", "tables", "images", "mixed")
+
+WORDS = (
+    "invoice shipment contract payment quarterly revenue customer supplier "
+    "warehouse delivery schedule report balance account transfer agreement "
+    "review department budget forecast summary analysis region total"
+).split()
+
+MALAY_WORDS = (
+    "laporan pembayaran pelanggan syarikat jumlah bulan tahun perjanjian "
+    "penghantaran bekalan kewangan jabatan anggaran ringkasan wilayah"
+).split()
+
+ARABIC_SENTENCE = "تقرير المبيعات السنوي للشركة يظهر نموا في جميع المناطق"
+
+PAGE_RECT = fitz.paper_rect("a4")
+MARGIN = 56
+
+
+def _sentence(rng: random.Random, words: list[str], length: int = 12) -> str:
+    return " ".join(rng.choice(words) for _ in range(length)).capitalize() + "."
+
+
+def _paragraphs(rng: random.Random, words: list[str], count: int) -> str:
+    return "\n\n".join(
+        " ".join(_sentence(rng, words) for _ in range(5)) for _ in range(count)
+    )
+
+
+def _text_page(doc: fitz.Document, rng: random.Random, words=WORDS) -> fitz.Page:
+    page = doc.new_page(width=PAGE_RECT.width, height=PAGE_RECT.height)
+    page.insert_textbox(
+        PAGE_RECT + (MARGIN, MARGIN, -MARGIN, -MARGIN),
+        _paragraphs(rng, words, 6),
+        fontsize=10,
+    )
+    return page
+
+
+def _draw_table(
+    page: fitz.Page, rng: random.Random, top: float, rows: int, cols: int
+) -> float:
+    """Draws a ruled table, which pdfplumber detects from its lines."""
+    width = (PAGE_RECT.width - 2 * MARGIN) / cols
+    height = 18
+    for row in range(rows):
+        for col in range(cols):
+            cell = fitz.Rect(
+                MARGIN + col * width,
+                top + row * height,
+                MARGIN + (col + 1) * width,
+                top + (row + 1) * height,
+            )
+            page.draw_rect(cell, color=(0, 0, 0), width=0.5)
+            text = (
+                rng.choice(WORDS).capitalize()
+                if row == 0 or col == 0
+                else f"{rng.randint(1, 99999):,}"
+            )
+            page.insert_text(cell.bl + (4, -5), text, fontsize=8)
+    return top + rows * height
+
+
+def _image_bytes(rng: random.Random, size: tuple[int, int]) -> bytes:
+    """Draws a random chart-like PNG."""
+    image = Image.new("RGB", size, tuple(rng.randint(180, 255) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randint(0, size[0] - 20), rng.randint(0, size[1] - 20)
+        draw.rectangle(
+            [x0, y0, x0 + rng.randint(10, 80), y0 + rng.randint(10, 80)],
+            fill=tuple(rng.randint(0, 200) for _ in range(3)),
+        )
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _add_page(doc: fitz.Document, kind: str, rng: random.Random) -> None:
+    if kind == "text":
+        _text_page(doc, rng)
+
+    elif kind == "scanned":
+        # Render a text page and keep only the raster, without a text layer
+        source = fitz.open()
+        pixmap = _text_page(source, rng).get_pixmap(
+            dpi=150, colorspace=fitz.csGRAY
+        )
+        page = doc.new_page(width=PAGE_RECT.width, height=PAGE_RECT.height)
+        page.insert_image(page.rect, pixmap=pixmap)
+        source.close()
+
+    elif kind == "tables":
+        page = doc.new_page(width=PAGE_RECT.width, height=PAGE_RECT.height)
+        top = MARGIN
+        for _ in range(3):
+            page.insert_text(
+                (MARGIN, top + 10), _sentence(rng, WORDS, 8), fontsize=10
+            )
+            rows = rng.randint(5, 8)
+            top = _draw_table(page, rng, top + 24, rows=rows, cols=4) + 24
+
+    elif kind == "images":
+        page = doc.new_page(width=PAGE_RECT.width, height=PAGE_RECT.height)
+        page.insert_text((MARGIN, MARGIN), _sentence(rng, WORDS), fontsize=10)
+        width = (PAGE_RECT.width - 2 * MARGIN - 20) / 2
+        for idx in range(4):
+            left = MARGIN + (idx % 2) * (width + 20)
+            top = MARGIN + 20 + (idx // 2) * (width + 20)
+            page.insert_image(
+                fitz.Rect(left, top, left + width, top + width),
+                stream=_image_bytes(rng, (320, 320)),
+            )
+
+    elif kind == "mixed":
+        page = _text_page(doc, rng, words=WORDS + MALAY_WORDS)
+        # Right-to-left text needs HTML layout with font fallback, which
+        # older PyMuPDF versions lack
+        if hasattr(page, "insert_htmlbox"):
+            box = fitz.Rect(
+                MARGIN,
+                PAGE_RECT.height - 120,
+                PAGE_RECT.width - MARGIN,
+                PAGE_RECT.height - MARGIN,
+            )
+            page.insert_htmlbox(box, f'<p dir="rtl">{ARABIC_SENTENCE}</p>')
+
+    else:
+        raise ValueError(f"Unknown document kind: {kind}")
+
+
+def generate_pdf(kind: str, num_pages: int, path: str, seed: int = 0) -> str:
+    """Generates a synthetic PDF.
+
+    Args:
+        kind (str): One of `KINDS`.
+        num_pages (int): Number of pages.
+        path (str): Where to save the PDF.
+        seed (int, optional): Seed of the random content (default: 0).
+
+    Returns:
+        str: The path of the PDF.
+    """
+    rng = random.Random(f"{kind}-{num_pages}-{seed}")
+    doc = fitz.open()
+    for _ in range(num_pages):
+        _add_page(doc, kind, rng)
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    doc.save(path)
+    doc.close()
+    return path
@@ -1,54 +1,238 @@
+import asyncio
 import base64
-import json
+import contextvars
+import io
 import os
-import time
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from PIL import Image
+
+from .ContextBuilder import ContextBuilder, estimate_tokens
+from .LLMCache import LLMCache
+from .Metrics import record_cache, record_usage, timed
 
 # For LM Studio models
 LM_API_URL = os.getenv("LM_API_URL")
 LM_API_KEY = os.getenv("LM_API_KEY")
 
-# Point to the local LM Studio server
-CLIENT = OpenAI(base_url=LM_API_URL, api_key=LM_API_KEY)
+# Timeout in seconds and retries (with exponential backoff) of each model call
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
 
+# Size of the HTTP connection pool to the model server
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_LIMITS = httpx.Limits(
+    max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS
+)
 
-def caption_image(image_path: str, client: OpenAI) -> str:
-    with open(image_path, "rb") as image_file:
-        base64_image = base64.b64encode(image_file.read()).decode("utf-8")
+# Point to the local LM Studio server, each client reusing pooled connections.
+# The sync client serves the worker threads, the async one the endpoints.
+CLIENT = OpenAI(
+    base_url=LM_API_URL,
+    api_key=LM_API_KEY,
+    timeout=LLM_TIMEOUT,
+    max_retries=LLM_MAX_RETRIES,
+    http_client=httpx.Client(limits=LLM_LIMITS, timeout=LLM_TIMEOUT),
+)
+ASYNC_CLIENT = AsyncOpenAI(
+    base_url=LM_API_URL,
+    api_key=LM_API_KEY,
+    timeout=LLM_TIMEOUT,
+    max_retries=LLM_MAX_RETRIES,
+    http_client=httpx.AsyncClient(limits=LLM_LIMITS, timeout=LLM_TIMEOUT),
+)
 
-    start_time = time.time()
-    response = client.chat.completions.create(
-        model="llava-v1.5-7b",
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an assistant specializing in generating captions for images.",
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "Describe this image in a concise caption.",
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{base64_image}"},
-                    },
-                ],
-            },
-        ],
-        temperature=0.7,
+# Maximum number of calls in flight per model, shared by every caller.
+# LLM_MODEL_CONCURRENCY overrides it per model, e.g. "llava-v1.5-7b=1,aya-expanse-8b=4"
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_MODEL_CONCURRENCY = {
+    model.strip(): int(limit)
+    for model, _, limit in (
+        item.partition("=")
+        for item in os.getenv("LLM_MODEL_CONCURRENCY", "").split(",")
+        if item.strip()
     )
-    inference_time = time.time() - start_time
-    print(f"Inference time: {inference_time} seconds")
-    return response.choices[0].message.content
+}
+_model_semaphores = {}
+_model_semaphores_lock = threading.Lock()
 
+# Threads on which async callers wait for a model semaphore, in the same
+# queue as the worker threads
+_semaphore_waiters = ThreadPoolExecutor(
+    max_workers=LLM_MAX_CONNECTIONS, thread_name_prefix="llm-semaphore"
+)
 
-def translate_text(text: str, client: OpenAI) -> str:
-    start_time = time.time()
-    response = client.chat.completions.create(
+# Persistent cache of model responses, disabled when LLM_CACHE_PATH is empty
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "backend/data/llm_cache.sqlite3")
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "512"))
+LLM_CACHE = (
+    LLMCache(LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024)
+    if LLM_CACHE_PATH
+    else None
+)
+
+# Approximate number of input tokens, and number of segments, packed into one
+# batched translation. Models tend to drop segments from very long lists
+TRANSLATION_BATCH_TOKENS = int(os.getenv("TRANSLATION_BATCH_TOKENS", "2048"))
+TRANSLATION_BATCH_SEGMENTS = int(os.getenv("TRANSLATION_BATCH_SEGMENTS", "32"))
+
+# Longest side, in pixels, of the images sent for captioning. llava-v1.5 sees
+# images at 336x336, so larger images only cost encoding and upload time
+CAPTION_IMAGE_SIZE = int(os.getenv("CAPTION_IMAGE_SIZE", "336"))
+
+# Marks the start of each segment in a batched translation, e.g. <<<3>>>
+SEGMENT_MARKER = re.compile(r"<<<(\d+)>>>")
+
+
+def model_semaphore(model: str) -> threading.BoundedSemaphore:
+    """Return the semaphore limiting the calls in flight to a model."""
+    with _model_semaphores_lock:
+        if model not in _model_semaphores:
+            _model_semaphores[model] = threading.BoundedSemaphore(
+                LLM_MODEL_CONCURRENCY.get(model, LLM_CONCURRENCY)
+            )
+        return _model_semaphores[model]
+
+
+def chat_completion(client: OpenAI, **kwargs):
+    """Create a chat completion while respecting the model's concurrency limit."""
+    with model_semaphore(kwargs["model"]):
+        response = client.chat.completions.create(**kwargs)
+    record_usage(kwargs["model"], response.usage)
+    return response
+
+
+async def _acquire(semaphore: threading.BoundedSemaphore) -> None:
+    """Wait for a semaphore shared with worker threads, yielding to the event loop.
+
+    The blocking wait runs on a thread, so async callers queue up for a free
+    slot alongside the worker threads instead of polling and losing every
+    release to them.
+    """
+    acquired = asyncio.get_running_loop().run_in_executor(
+        _semaphore_waiters, semaphore.acquire
+    )
+    try:
+        await asyncio.shield(acquired)
+    except asyncio.CancelledError:
+        # The wait keeps going, hand the slot back as soon as it is acquired
+        acquired.add_done_callback(lambda _: semaphore.release())
+        raise
+
+
+async def achat_completion(client: AsyncOpenAI, **kwargs):
+    """Async version of `chat_completion`."""
+    semaphore = model_semaphore(kwargs["model"])
+    await _acquire(semaphore)
+    try:
+        response = await client.chat.completions.create(**kwargs)
+    finally:
+        semaphore.release()
+    record_usage(kwargs["model"], response.usage)
+    return response
+
+
+def cached_completion(client: OpenAI, function: str, **kwargs) -> str:
+    """Return the content of a chat completion, reusing cached responses.
+
+    The cache key covers the calling function and every request parameter,
+    i.e. the model, the system and user messages (including image data) and
+    the temperature.
+    """
+    if LLM_CACHE is None:
+        return chat_completion(client, **kwargs).choices[0].message.content
+
+    key = LLM_CACHE.make_key(function=function, **kwargs)
+    content = LLM_CACHE.get(key)
+    record_cache("llm", content is not None)
+    if content is None:
+        content = chat_completion(client, **kwargs).choices[0].message.content
+        LLM_CACHE.set(key, content)
+    return content
+
+
+async def acached_completion(client: AsyncOpenAI, function: str, **kwargs) -> str:
+    """Async version of `cached_completion`.
+
+    The cache is queried in a worker thread, so its SQLite reads and writes
+    don't block the event loop.
+    """
+    if LLM_CACHE is None:
+        response = await achat_completion(client, **kwargs)
+        return response.choices[0].message.content
+
+    key = LLM_CACHE.make_key(function=function, **kwargs)
+    content = await asyncio.to_thread(LLM_CACHE.get, key)
+    record_cache("llm", content is not None)
+    if content is None:
+        response = await achat_completion(client, **kwargs)
+        content = response.choices[0].message.content
+        await asyncio.to_thread(LLM_CACHE.set, key, content)
+    return content
+
+
+def _caption_image_url(img_bytes: bytes) -> str:
+    """Downscale an image to `CAPTION_IMAGE_SIZE` and encode it as a data URL.
+
+    Images Pillow cannot decode are sent unchanged.
+    """
+    try:
+        with Image.open(io.BytesIO(img_bytes)) as image:
+            image = image.convert("RGBA")
+    except Exception:
+        return f"data:image/png;base64,{base64.b64encode(img_bytes).decode('utf-8')}"
+
+    # Flatten transparency onto white, as JPEG has no alpha channel
+    image.thumbnail((CAPTION_IMAGE_SIZE, CAPTION_IMAGE_SIZE))
+    flattened = Image.new("RGB", image.size, "white")
+    flattened.paste(image, mask=image.getchannel("A"))
+    buffer = io.BytesIO()
+    flattened.save(buffer, format="JPEG", quality=90)
+    base64_image = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    return f"data:image/jpeg;base64,{base64_image}"
+
+
+def caption_image(img_bytes: bytes, client: OpenAI) -> str:
+    """Caption an image given its encoded bytes."""
+    image_url = _caption_image_url(img_bytes)
+
+    with timed("caption"):
+        content = cached_completion(
+            client,
+            "caption_image",
+            model="llava-v1.5-7b",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are an assistant specializing in generating captions for images.",
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": "Describe this image in a concise caption.",
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": image_url},
+                        },
+                    ],
+                },
+            ],
+            temperature=0.7,
+        )
+    return content
+
+
+def _translate_text_request(text: str) -> dict:
+    """Build the chat completion parameters translating a text into English."""
+    return dict(
         model="aya-expanse-8b",
         messages=[
             {
@@ -59,45 +243,187 @@ def translate_text(text: str, client: OpenAI) -> str:
         ],
         temperature=0,
     )
-    inference_time = time.time() - start_time
-    print(f"Inference time: {inference_time} seconds")
-    return response.choices[0].message.content
+
+
+def translate_text(text: str, client: OpenAI) -> str:
+    with timed("translate"):
+        content = cached_completion(
+            client, "translate_text", **_translate_text_request(text)
+        )
+    return content
+
+
+async def atranslate_text(text: str, client: AsyncOpenAI) -> str:
+    """Async version of `translate_text`."""
+    with timed("translate"):
+        content = await acached_completion(
+            client, "translate_text", **_translate_text_request(text)
+        )
+    return content
+
+
+def translate_texts(
+    texts: list[str],
+    client: OpenAI,
+    max_batch_tokens: int = TRANSLATION_BATCH_TOKENS,
+    max_batch_segments: int = TRANSLATION_BATCH_SEGMENTS,
+) -> list[str]:
+    """Translate many texts into English with as few requests as possible.
+
+    Texts are packed in order into batches of up to `max_batch_tokens`
+    approximate tokens and `max_batch_segments` texts, and the batches are
+    translated concurrently.
+
+    Returns:
+        list[str]: The translations, in the same order as `texts`.
+    """
+    return _map_batches(
+        _translate_batch, texts, client, max_batch_tokens, max_batch_segments
+    )
+
+
+def _map_batches(
+    function,
+    texts: list[str],
+    client: OpenAI,
+    max_batch_tokens: int,
+    max_batch_segments: int,
+):
+    """Apply a batched model call to texts packed into batches of up to
+    `max_batch_tokens` approximate tokens and `max_batch_segments` texts,
+    running the batches concurrently.
+
+    Returns:
+        list[str]: The results, in the same order as `texts`.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for idx, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if batch and (
+            batch_tokens + tokens > max_batch_tokens
+            or len(batch) >= max_batch_segments
+        ):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(idx)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+
+    results = [None] * len(texts)
+    with ThreadPoolExecutor(max_workers=LLM_CONCURRENCY) as pool:
+        # Run every batch in a copy of the caller's context so its timings
+        # are recorded into the caller's job metrics
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run,
+                function,
+                [texts[idx] for idx in batch],
+                client,
+            )
+            for batch in batches
+        ]
+        for batch, future in zip(batches, futures):
+            for idx, result in zip(batch, future.result()):
+                results[idx] = result
+
+    return results
+
+
+def _split_segments(content: str) -> dict[int, str]:
+    """Split a batched reply back into its segments on the <<<n>>> markers."""
+    parts = SEGMENT_MARKER.split(content)
+    return {
+        int(number): segment.strip("\n")
+        for number, segment in zip(parts[1::2], parts[2::2])
+    }
+
+
+def _translate_batch(texts: list[str], client: OpenAI) -> list[str]:
+    """Translate several texts in a single request.
+
+    Each text is sent as a segment starting with a <<<n>>> marker. Segments
+    missing from the reply are translated on their own.
+    """
+    if len(texts) == 1:
+        return [translate_text(texts[0], client)]
+
+    segments_content = "\n".join(
+        f"<<<{idx}>>>\n{text}" for idx, text in enumerate(texts, start=1)
+    )
+    with timed("translate"):
+        content = cached_completion(
+            client,
+            "_translate_batch",
+            model="aya-expanse-8b",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are an assistant specializing in translating content into english. The user will provide several segments, each starting with a marker line such as <<<1>>>. Translate every segment into english and reply with the same marker lines, in the same order, each followed by the translated english text of its segment. Do not add any further inputs and explanation while keeping the original formatting the same",
+                },
+                {"role": "user", "content": segments_content},
+            ],
+            temperature=0,
+        )
+
+    segments = _split_segments(content)
+    return [
+        segments[idx] if segments.get(idx) else translate_text(text, client)
+        for idx, text in enumerate(texts, start=1)
+    ]
 
 
 def summarize_text(text: str, client: OpenAI) -> str:
-    start_time = time.time()
-    response = client.chat.completions.create(
-        model="aya-expanse-8b",
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an assistant specializing in summarizing content. Your task is to provide a concise summary of the given text. Focus on the main points and key information, while avoiding unnecessary details.",
-            },
-            {"role": "user", "content": text},
-        ],
-        temperature=0.2,
+    with timed("summarize"):
+        content = cached_completion(
+            client,
+            "summarize_text",
+            model="aya-expanse-8b",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are an assistant specializing in summarizing content. Your task is to provide a concise summary of the given text. Focus on the main points and key information, while avoiding unnecessary details.",
+                },
+                {"role": "user", "content": text},
+            ],
+            temperature=0.2,
+        )
+    return content
+
+
+def table_text(table: list) -> str:
+    """Render a table as one line per row, with cells separated by " | "."""
+    return "\n".join(
+        " | ".join(
+            "" if cell is None else str(cell).replace("\n", " ") for cell in row
+        )
+        for row in table
     )
-    inference_time = time.time() - start_time
-    print(f"Inference time: {inference_time} seconds")
-    return response.choices[0].message.content
 
 
-def summarize_table(data: list, client: OpenAI) -> list:
-    start_time = time.time()
+def summarize_table(data: list, client: OpenAI) -> str:
+    return _summarize_table_text(table_text(data), client)
+
+
+def _summarize_table_text(text: str, client: OpenAI) -> str:
     prompt = f"""
         <|START_OF_TURN_TOKEN|><|USER_TOKEN|>Provide a text summary in English of the following table provided:
 
-        {json.dumps(data)}
+        {text}
 
         Provide only the text summary, without any additional explanations.<|END_OF_TURN_TOKEN|><|START_OF_TURN_TOKEN|><|ASSISTANT_TOKEN|>
     """
 
-    response = client.chat.completions.create(
-        model="aya-expanse-8b",
-        messages=[
-            {
-                "role": "system",
-                "content": """
+    with timed("summarize"):
+        content = cached_completion(
+            client,
+            "summarize_table",
+            model="aya-expanse-8b",
+            messages=[
+                {
+                    "role": "system",
+                    "content": """
                     You are a helpful assistant tasked with summarizing the contents of the following table. Your summary should focus on extracting the most important information, identifying key trends, and providing a concise, easy-to-understand overview. When summarizing, consider the following:
                     - Identify and highlight key data points.
                     - Mention any trends or patterns that emerge from the table.
@@ -105,105 +431,161 @@ def summarize_table(data: list, client: OpenAI) -> list:
                     - Make sure the summary is clear and understandable even for someone unfamiliar with the table’s context.
                     The summaries will also be used for retrieval augmented generation purposes.
                 """,
-            },
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.2,
-    )
+                },
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.2,
+        )
 
-    inference_time = time.time() - start_time
-    print(f"Inference time: {inference_time} seconds")
-    return response.choices[0].message.content
+    return content
 
 
-def translate_table(table, client: OpenAI) -> str:
-    data = {"table_data": table}
-    start_time = time.time()
-    print(json.dumps(data["table_data"]))
-    prompt = f"""
-    <|START_OF_TURN_TOKEN|><|USER_TOKEN|>Translate the following table into English, maintaining the original format:
+def summarize_tables(
+    tables: list[list],
+    client: OpenAI,
+    max_batch_tokens: int = TRANSLATION_BATCH_TOKENS,
+    max_batch_segments: int = TRANSLATION_BATCH_SEGMENTS,
+) -> list[str]:
+    """Summarize many tables in English with as few requests as possible.
 
-    {json.dumps(data['table_data'])}
+    Tables are rendered with `table_text` and packed in order into batches
+    of up to `max_batch_tokens` approximate tokens and `max_batch_segments`
+    tables, like `translate_texts`.
 
-    Provide only the translated table, without any additional explanations.<|END_OF_TURN_TOKEN|><|START_OF_TURN_TOKEN|><|ASSISTANT_TOKEN|>
-        """
+    Returns:
+        list[str]: The summaries, in the same order as `tables`.
+    """
+    texts = [table_text(table) for table in tables]
+    return _map_batches(
+        _summarize_batch, texts, client, max_batch_tokens, max_batch_segments
+    )
 
-    response = client.chat.completions.create(
-        model="aya-expanse-8b",
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                    You are a helpful assistant tasked with translating the tables into English. The user will give u inputs in the form of nested lists,
-                    Translate each list contents and return with a nested list of the translated contents.
-                """,
-            },
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.2,
+
+def _summarize_batch(texts: list[str], client: OpenAI) -> list[str]:
+    """Summarize several rendered tables in a single request.
+
+    Each table is sent as a segment starting with a <<<n>>> marker. Tables
+    missing from the reply are summarized on their own.
+    """
+    if len(texts) == 1:
+        return [_summarize_table_text(texts[0], client)]
+
+    segments_content = "\n".join(
+        f"<<<{idx}>>>\n{text}" for idx, text in enumerate(texts, start=1)
     )
-    inference_time = time.time() - start_time
-    print(f"Inference time: {inference_time} seconds")
-
-    return json.loads(response.choices[0].message.content)
-
-
-def rag_prompt(prompt, docs, pages_data, client: OpenAI) -> str:
-    start_time = time.time()
-
-    helping = ""
-    for i, doc in enumerate(docs):
-        if doc.metadata.get("type") == "text":
-            helping += f"- {doc.page_content}\n"
-        elif doc.metadata.get("type") == "table":
-            found = False
-            for page in pages_data:
-                for trans_table_summary in page.get("translated_tables_summary", []):
-                    if trans_table_summary["key"] == doc.metadata.get(
-                        "trans_table_summary_key"
-                    ):
-                        helping += f"- {trans_table_summary['translated_table']}\n"
-                        found = True
-                        break
-                if found:
-                    break
-        elif doc.metadata.get("type") == "image":
-            found = False
-            for page in pages_data:
-                for image in page.get("images", []):
-                    if image["key"] == doc.metadata.get("image_caption_key"):
-                        helping += f"- {image['caption']}\n"
-                        found = True
-                        break
-                if found:
-                    break
-
-        # Keep number of tokens within limit
-        if len(helping) > 8192:
-            helping = helping[: 8000 - len(prompt)]
-            docs = docs[: i + 1]
-            break
-
-    prompt_with_help = f"""Answer this prompt:
+    with timed("summarize"):
+        content = cached_completion(
+            client,
+            "_summarize_batch",
+            model="aya-expanse-8b",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a helpful assistant tasked with summarizing tables in English. The user will provide several tables, each starting with a marker line such as <<<1>>> and with one row per line. Reply with the same marker lines, in the same order, each followed by a brief summary of its table that highlights the key data points and any trends, clear even for someone unfamiliar with the table's context. The summaries will also be used for retrieval augmented generation purposes.",
+                },
+                {"role": "user", "content": segments_content},
+            ],
+            temperature=0.2,
+        )
+
+    segments = _split_segments(content)
+    return [
+        segments[idx] if segments.get(idx) else _summarize_table_text(text, client)
+        for idx, text in enumerate(texts, start=1)
+    ]
+
+
+def _build_rag_messages(prompt, docs, items) -> tuple[list, list, list]:
+    """Build the chat messages of a RAG prompt from the retrieved documents.
+
+    `items` holds the document store item of each document (None when the
+    document is not in the store), used to put whole translated tables into
+    the context. Returns the messages, the documents packed into the context
+    and the dropped documents.
+    """
+    texts = []
+    for doc, item in zip(docs, items):
+        if item and item["type"] == "table":
+            texts.append(str(item["translated_table"]))
+        elif item and item["type"] == "image":
+            texts.append(item["caption"])
+        else:
+            texts.append(doc.page_content)
+
+    system_prompt = """
+                You are a helpful assistant for answering user questions with detailed information. You also have RAG capabilities, thus you will be given retrieved documents that are relevant to the question.
+            """
+    prompt_template = """Answer this prompt:
         {prompt}
         Use the following pieces of context (if needed) to support and answer the question.
         {helping}
     """
 
-    response = client.chat.completions.create(
-        model="aya-expanse-8b",
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                    You are a helpful assistant for answering user questions with detailed information. You also have RAG capabilities, thus you will be given retrieved documents that are relevant to the question.
-                """,
-            },
-            {"role": "user", "content": prompt_with_help},
-        ],
-        temperature=0.2,
+    # Keep number of tokens within limit
+    helping, docs, dropped = ContextBuilder().build(
+        docs,
+        texts,
+        reserved=system_prompt + prompt_template.format(prompt=prompt, helping=""),
     )
-    inference_time = time.time() - start_time
-    print(f"Inference time: {inference_time} seconds")
 
-    return response.choices[0].message.content, docs
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": prompt_template.format(prompt=prompt, helping=helping),
+        },
+    ]
+    return messages, docs, dropped
+
+
+async def arag_prompt(
+    prompt, docs, items, client: AsyncOpenAI
+) -> tuple[str, list, list]:
+    """Answer a RAG prompt from the retrieved documents.
+
+    Returns the answer, and the documents used as context and dropped from it.
+    """
+
+    messages, docs, dropped = _build_rag_messages(prompt, docs, items)
+    with timed("generate"):
+        response = await achat_completion(
+            client,
+            model="aya-expanse-8b",
+            messages=messages,
+            temperature=0.2,
+        )
+
+    return response.choices[0].message.content, docs, dropped
+
+
+def arag_prompt_stream(
+    prompt, docs, items, client: AsyncOpenAI
+) -> tuple[AsyncIterator[str], list, list]:
+    """Stream the answer to a RAG prompt.
+
+    Returns an async iterator over the answer tokens as they are generated,
+    and the documents used as context and dropped from it, which are known
+    before generation starts.
+    """
+    messages, docs, dropped = _build_rag_messages(prompt, docs, items)
+
+    async def stream_tokens():
+        semaphore = model_semaphore("aya-expanse-8b")
+        with timed("generate"):
+            await _acquire(semaphore)
+            try:
+                stream = await client.chat.completions.create(
+                    model="aya-expanse-8b",
+                    messages=messages,
+                    temperature=0.2,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                async for chunk in stream:
+                    record_usage("aya-expanse-8b", getattr(chunk, "usage", None))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                semaphore.release()
+
+    return stream_tokens(), docs, dropped
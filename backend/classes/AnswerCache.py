@@ -0,0 +1,194 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from .BM25Index import IDENTIFIER_PATTERN, tokenize
+from .Metrics import record_cache
+
+
+# Answers are reused for this many seconds, 0 disables the cache
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+# Cosine similarity of query embeddings above which two prompts are
+# considered the same question, 1 only reuses exact (normalized) matches
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercases a prompt and strips whitespace and trailing punctuation."""
+    return re.sub(r"\s+", " ", prompt).strip().rstrip("?!. ").lower()
+
+
+def prompt_identifiers(prompt: str) -> frozenset:
+    """Returns the numbers and identifiers of a prompt, like "inv-1001" or "2024".
+
+    Prompts differing only by these embed almost identically but ask about
+    different things, so near-duplicates must have the same ones.
+    """
+    return frozenset(
+        term
+        for term in tokenize(prompt)
+        if any(char.isdigit() for char in term) or IDENTIFIER_PATTERN.fullmatch(term)
+    )
+
+
+class AnswerCache:
+    """An in-memory cache of chat answers.
+
+    Answers are keyed by the documents searched, the number of retrieved
+    documents, the retrieval mode and the normalized prompt. Near-identical
+    prompts are matched through the similarity of their query embeddings,
+    provided they mention the same numbers and identifiers.
+    Entries expire after `ttl` seconds and are dropped when one of their
+    documents is re-ingested or deleted.
+    """
+
+    def __init__(
+        self,
+        ttl: int = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        embed_query: Optional[Callable[[str], list[float]]] = None,
+    ):
+        """
+        Initializes the AnswerCache.
+
+        Args:
+            ttl (int, optional): Seconds an answer is reused (default: `ANSWER_CACHE_TTL`).
+            threshold (float, optional): Similarity for near-duplicate prompts (default: `ANSWER_CACHE_THRESHOLD`).
+            max_entries (int, optional): Maximum number of cached answers (default: `ANSWER_CACHE_SIZE`).
+            embed_query (Callable, optional): Embeds a prompt, needed for near-duplicate matching.
+        """
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.embed_query = embed_query
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(
+        self, prompt: str, doc_ids: Optional[list[str]], num_docs: int, mode: str
+    ) -> Optional[dict]:
+        """Returns the cached answer to a prompt, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        scope = self._scope(doc_ids, num_docs, mode)
+        normalized = normalize_prompt(prompt)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get((scope, normalized))
+            identifiers = prompt_identifiers(prompt)
+            candidates = [
+                candidate
+                for (candidate_scope, _), candidate in self._entries.items()
+                if candidate_scope == scope
+                and candidate["identifiers"] == identifiers
+            ]
+
+        if entry is None and candidates and self._use_similarity(mode):
+            embedding = self.embed_query(prompt)
+            score, best = max(
+                (
+                    (self._cosine(embedding, candidate["embedding"]), candidate)
+                    for candidate in candidates
+                    if candidate["embedding"]
+                ),
+                default=(0, None),
+                key=lambda pair: pair[0],
+            )
+            if score >= self.threshold:
+                entry = best
+
+        record_cache("answer", entry is not None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["answer"]
+
+    def set(
+        self,
+        prompt: str,
+        doc_ids: Optional[list[str]],
+        num_docs: int,
+        mode: str,
+        answer: dict,
+    ) -> None:
+        """Stores the answer to a prompt."""
+        if not self.enabled:
+            return
+
+        scope = self._scope(doc_ids, num_docs, mode)
+        embedding = self.embed_query(prompt) if self._use_similarity(mode) else None
+        key = (scope, normalize_prompt(prompt))
+        with self._lock:
+            # Re-insert at the end to keep the entries ordered by age
+            self._entries.pop(key, None)
+            self._entries[key] = {
+                "doc_ids": scope[0],
+                "embedding": embedding,
+                "identifiers": prompt_identifiers(prompt),
+                "answer": answer,
+                "created_at": time.time(),
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doc_id: str) -> None:
+        """Drops the answers that may depend on a document.
+
+        This includes every answer searched across the whole library.
+        """
+        with self._lock:
+            for key in [
+                key
+                for key, entry in self._entries.items()
+                if entry["doc_ids"] is None or doc_id in entry["doc_ids"]
+            ]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        """Returns the hit/miss counters and the number of cached answers."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
+
+    def _use_similarity(self, mode: str) -> bool:
+        """Near-duplicate matching needs embeddings, never used in lexical mode."""
+        return (
+            self.embed_query is not None and self.threshold < 1 and mode != "lexical"
+        )
+
+    def _expire(self) -> None:
+        """Drops the answers older than `ttl`, which are at the front."""
+        cutoff = time.time() - self.ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry["created_at"] >= cutoff:
+                break
+            del self._entries[key]
+
+    @staticmethod
+    def _scope(doc_ids: Optional[list[str]], num_docs: int, mode: str) -> tuple:
+        return (tuple(sorted(doc_ids)) if doc_ids else None, num_docs, mode)
+
+    @staticmethod
+    def _cosine(a: list[float], b: list[float]) -> float:
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
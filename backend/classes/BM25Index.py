@@ -0,0 +1,163 @@
+import json
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+
+
+# Directory where the inverted index of each ingested document is persisted
+BM25_DIR = os.getenv("BM25_DIR", "backend/data/bm25")
+
+# Words, plus identifiers such as invoice or article numbers kept whole
+WORD_PATTERN = re.compile(r"\w+")
+IDENTIFIER_PATTERN = re.compile(r"\w+(?:[-/.:]\w+)+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits a text into lowercase terms for lexical search.
+
+    Identifiers like "INV-2024/001" are indexed both whole and as their parts,
+    so exact identifiers match precisely and partial ones still match.
+    """
+    text = text.lower()
+    return WORD_PATTERN.findall(text) + IDENTIFIER_PATTERN.findall(text)
+
+
+class BM25Index:
+    """A local inverted index ranking documents with Okapi BM25.
+
+    Every ingested PDF gets its own postings, persisted as JSON, and the
+    corpus statistics are combined at query time, so searches can be scoped
+    to any set of PDFs without rebuilding anything.
+    """
+
+    def __init__(
+        self, index_dir: str = BM25_DIR, k1: float = 1.5, b: float = 0.75
+    ):
+        """
+        Initializes the BM25Index.
+
+        Args:
+            index_dir (str, optional): Directory for persisted indexes (default: `BM25_DIR`).
+            k1 (float, optional): Term frequency saturation (default: 1.5).
+            b (float, optional): Document length normalization (default: 0.75).
+        """
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._indexes = {}  # Index of each loaded PDF, keyed by doc ID
+        self._lock = threading.Lock()
+        for file in os.listdir(self.index_dir):
+            if file.endswith(".json"):
+                with open(os.path.join(self.index_dir, file)) as f:
+                    self._indexes[file[: -len(".json")]] = json.load(f)
+
+    def add_document(
+        self, doc_id: str, docs: list[dict], replace: bool = True
+    ) -> None:
+        """Indexes the documents of a PDF.
+
+        Args:
+            doc_id (str): The ID of the PDF.
+            docs (list[dict]): The documents with `page_content` and `metadata`.
+            replace (bool, optional): Replace the index of an already indexed PDF (default: True).
+        """
+        if not replace and self.has_document(doc_id):
+            return
+
+        postings = {}
+        lengths = []
+        for idx, doc in enumerate(docs):
+            terms = Counter(tokenize(doc["page_content"]))
+            lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append([idx, tf])
+
+        index = {
+            "docs": [
+                {
+                    "page_content": doc["page_content"],
+                    "metadata": {**doc["metadata"], "doc_id": doc_id},
+                }
+                for doc in docs
+            ],
+            "lengths": lengths,
+            "postings": postings,
+        }
+
+        # Check and write under the lock, so concurrent ingestions of the
+        # same PDF don't both write its index
+        with self._lock:
+            if not replace and doc_id in self._indexes:
+                return
+
+            path = self._index_path(doc_id)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, path)
+            self._indexes[doc_id] = index
+
+    def has_document(self, doc_id: str) -> bool:
+        """Checks whether a PDF has been indexed."""
+        return doc_id in self._indexes
+
+    def delete_document(self, doc_id: str) -> None:
+        """Removes a PDF from the index."""
+        with self._lock:
+            if self._indexes.pop(doc_id, None) is not None:
+                os.remove(self._index_path(doc_id))
+
+    def search(
+        self, query: str, top_k: int, doc_ids: list[str] = None
+    ) -> list[tuple[dict, float]]:
+        """Ranks the indexed documents against a query.
+
+        Args:
+            query (str): The search query.
+            top_k (int): The number of documents to return.
+            doc_ids (list[str], optional): Only search these PDFs, by default all of them.
+
+        Returns:
+            list[tuple[dict, float]]: The best documents and their BM25 scores.
+        """
+        with self._lock:
+            indexes = {
+                doc_id: index
+                for doc_id, index in self._indexes.items()
+                if not doc_ids or doc_id in doc_ids
+            }
+
+        num_docs = sum(len(index["lengths"]) for index in indexes.values())
+        if not num_docs:
+            return []
+        total_length = sum(sum(index["lengths"]) for index in indexes.values())
+        avg_length = total_length / num_docs
+
+        scores = Counter()
+        for term in set(tokenize(query)):
+            doc_freq = sum(
+                len(index["postings"].get(term, [])) for index in indexes.values()
+            )
+            if not doc_freq:
+                continue
+            idf = math.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+            for doc_id, index in indexes.items():
+                for idx, tf in index["postings"].get(term, []):
+                    length = index["lengths"][idx]
+                    length_norm = 1 - self.b + self.b * length / avg_length
+                    scores[(doc_id, idx)] += (
+                        idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+                    )
+
+        return [
+            (indexes[doc_id]["docs"][idx], score)
+            for (doc_id, idx), score in scores.most_common(top_k)
+        ]
+
+    def _index_path(self, doc_id: str) -> str:
+        return os.path.join(self.index_dir, f"{doc_id}.json")
@@ -0,0 +1,141 @@
+import hashlib
+import io
+import os
+import re
+import uuid
+
+from PIL import Image
+
+
+# Directory where extracted images are stored, once per distinct content
+BLOBS_DIR = os.getenv("BLOBS_DIR", "backend/data/blobs")
+
+# Longest sides, in pixels, that thumbnails can be requested at
+BLOB_THUMBNAIL_SIZES = tuple(
+    int(size) for size in os.getenv("BLOB_THUMBNAIL_SIZES", "128,256,512").split(",")
+)
+
+BLOB_ID_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class BlobStore:
+    """A content-addressed store of binary files such as extracted images.
+
+    Blobs are identified by the SHA-256 of their contents, so an image
+    repeated across pages or documents is stored once, and a blob never
+    changes once written. Thumbnails are rendered on first request and kept
+    next to the blobs.
+    """
+
+    def __init__(self, blobs_dir: str = BLOBS_DIR):
+        """
+        Initializes the BlobStore.
+
+        Args:
+            blobs_dir (str, optional): Directory for stored blobs (default: `BLOBS_DIR`).
+        """
+        self.blobs_dir = blobs_dir
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self._media_types = {}  # Sniffed media type of each blob, keyed by blob ID
+
+    def put(self, data: bytes) -> str:
+        """Stores a blob, unless the same contents are already stored.
+
+        Args:
+            data (bytes): The contents of the blob.
+
+        Returns:
+            str: The blob ID.
+        """
+        blob_id = hashlib.sha256(data).hexdigest()
+        path = self.path(blob_id)
+        if not os.path.isfile(path):
+            self._write(path, data)
+        return blob_id
+
+    def has(self, blob_id: str) -> bool:
+        """Checks whether a blob is stored."""
+        try:
+            return os.path.isfile(self.path(blob_id))
+        except KeyError:
+            return False
+
+    def get(self, blob_id: str) -> bytes:
+        """Returns the contents of a blob.
+
+        Raises:
+            KeyError: If the blob is not stored.
+        """
+        if not self.has(blob_id):
+            raise KeyError(blob_id)
+        with open(self.path(blob_id), "rb") as f:
+            return f.read()
+
+    def path(self, blob_id: str) -> str:
+        """Returns the file of a blob, rejecting IDs that are not SHA-256 digests."""
+        if not isinstance(blob_id, str) or not BLOB_ID_PATTERN.fullmatch(blob_id):
+            raise KeyError(blob_id)
+        return os.path.join(self.blobs_dir, blob_id[:2], blob_id)
+
+    def media_type(self, blob_id: str) -> str:
+        """Returns the media type of a stored image blob, sniffed from its contents."""
+        if blob_id not in self._media_types:
+            try:
+                with Image.open(self.path(blob_id)) as image:
+                    media_type = Image.MIME.get(image.format)
+            except Exception:
+                media_type = None
+            self._media_types[blob_id] = media_type or "application/octet-stream"
+        return self._media_types[blob_id]
+
+    def thumbnail(self, blob_id: str, size: int) -> str:
+        """Returns the file of a JPEG thumbnail of an image blob, rendering it if needed.
+
+        Args:
+            blob_id (str): The blob ID.
+            size (int): Longest side of the thumbnail, one of `BLOB_THUMBNAIL_SIZES`.
+
+        Returns:
+            str: Path of the thumbnail.
+
+        Raises:
+            KeyError: If the blob is not stored.
+            ValueError: If the size is not allowed or the blob is not an image.
+        """
+        if size not in BLOB_THUMBNAIL_SIZES:
+            raise ValueError(f"Unsupported thumbnail size: {size}")
+        if not self.has(blob_id):
+            raise KeyError(blob_id)
+
+        path = self._thumbnail_path(blob_id, size)
+        if os.path.isfile(path):
+            return path
+
+        try:
+            with Image.open(self.path(blob_id)) as image:
+                image.thumbnail((size, size))
+                # Flatten transparency onto white, JPEG has no alpha channel
+                image = image.convert("RGBA")
+                thumbnail = Image.new("RGB", image.size, (255, 255, 255))
+                thumbnail.paste(image, mask=image.getchannel("A"))
+        except Exception as e:
+            raise ValueError(f"Blob {blob_id} is not an image: {e}")
+
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, format="JPEG", quality=85)
+        self._write(path, buffer.getvalue())
+        return path
+
+    def _thumbnail_path(self, blob_id: str, size: int) -> str:
+        return os.path.join(
+            self.blobs_dir, "thumbnails", str(size), blob_id[:2], f"{blob_id}.jpg"
+        )
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        """Writes a file atomically, so readers never see a partial blob."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
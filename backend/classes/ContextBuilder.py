@@ -0,0 +1,105 @@
+import math
+import os
+import re
+from typing import Callable
+
+
+# Token budget of a RAG prompt, including the question and instructions
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "4096"))
+
+# Share of a chunk's word trigrams found in an already packed chunk above
+# which the chunk is considered a duplicate
+DUPLICATE_OVERLAP = float(os.getenv("DUPLICATE_OVERLAP", "0.8"))
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of tokens in a text without a tokenizer.
+
+    Every punctuation mark counts as one token and every word as one token per
+    four characters, which tracks subword tokenizers closely for both Latin
+    and non-Latin scripts.
+    """
+    return sum(math.ceil(len(token) / 4) for token in TOKEN_PATTERN.findall(text))
+
+
+class ContextBuilder:
+    """Packs retrieved documents into the context of a RAG prompt.
+
+    Documents are taken in rank order and added whole while they fit into the
+    token budget, so tables are never cut mid-row. Chunks that mostly repeat
+    an already packed chunk are skipped.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = RAG_CONTEXT_TOKENS,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+        duplicate_overlap: float = DUPLICATE_OVERLAP,
+    ):
+        """
+        Initializes the ContextBuilder.
+
+        Args:
+            max_tokens (int, optional): Token budget of the whole prompt (default: `RAG_CONTEXT_TOKENS`).
+            count_tokens (Callable, optional): Counts the tokens of a text (default: `estimate_tokens`).
+            duplicate_overlap (float, optional): Overlap above which a chunk is a duplicate (default: `DUPLICATE_OVERLAP`).
+        """
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.duplicate_overlap = duplicate_overlap
+
+    def build(
+        self, docs: list, texts: list[str], reserved: str = ""
+    ) -> tuple[str, list, list[dict]]:
+        """Packs the highest-ranked documents into a context.
+
+        Args:
+            docs (list[Document]): The retrieved documents, best first.
+            texts (list[str]): The context text of each document.
+            reserved (str, optional): The rest of the prompt, counted against the budget.
+
+        Returns:
+            tuple[str, list, list[dict]]: The context, the packed documents and
+                the dropped documents with the reason ("duplicate" or "budget").
+        """
+        budget = self.max_tokens - self.count_tokens(reserved)
+        context = ""
+        packed, dropped = [], []
+        packed_shingles = []
+
+        for doc, text in zip(docs, texts):
+            shingles = self._shingles(text)
+            if any(
+                self._overlap(shingles, other) >= self.duplicate_overlap
+                for other in packed_shingles
+            ):
+                dropped.append({"metadata": doc.metadata, "reason": "duplicate"})
+                continue
+
+            entry = f"- {text}\n"
+            tokens = self.count_tokens(entry)
+            if tokens > budget:
+                dropped.append({"metadata": doc.metadata, "reason": "budget"})
+                continue
+
+            context += entry
+            budget -= tokens
+            packed.append(doc)
+            packed_shingles.append(shingles)
+
+        return context, packed, dropped
+
+    @staticmethod
+    def _shingles(text: str) -> set:
+        """Returns the word trigrams of a text."""
+        words = text.lower().split()
+        if len(words) < 3:
+            return {tuple(words)}
+        return {tuple(words[i : i + 3]) for i in range(len(words) - 2)}
+
+    @staticmethod
+    def _overlap(shingles: set, other: set) -> float:
+        """Returns the share of `shingles` that also appear in `other`."""
+        return len(shingles & other) / len(shingles)
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import uuid
+from typing import Optional
+
+
+# Directory where the key index of each processed document is persisted
+DOCUMENTS_DIR = os.getenv("DOCUMENTS_DIR", "backend/data/documents")
+
+
+class DocumentStore:
+    """Server-side store of processed documents, indexed by item key.
+
+    For every document the text chunks, translated tables and image captions
+    are indexed by their `text_chunk_key`, `trans_table_summary_key` and
+    `image_caption_key`, so retrieved documents are resolved in O(1) instead
+    of having the client send `pages_data` back with every request.
+    """
+
+    def __init__(self, documents_dir: str = DOCUMENTS_DIR):
+        """
+        Initializes the DocumentStore.
+
+        Args:
+            documents_dir (str, optional): Directory for persisted indexes (default: `DOCUMENTS_DIR`).
+        """
+        self.documents_dir = documents_dir
+        os.makedirs(self.documents_dir, exist_ok=True)
+        self._indexes = {}  # Key index of each loaded document, keyed by doc ID
+        self._lock = threading.Lock()
+
+    def add_document(
+        self, doc_id: str, pages: list[dict], replace: bool = True
+    ) -> dict:
+        """Indexes and persists the pages of a processed document.
+
+        Args:
+            doc_id (str): The document ID.
+            pages (list[dict]): The `pages_data` and `documents` of each page.
+            replace (bool, optional): Replace the index of an already indexed document (default: True).
+
+        Returns:
+            dict: The key index of the document.
+        """
+        index = {}
+        for page in pages:
+            pages_data = page["pages_data"]
+            page_number = pages_data["page_number"]
+
+            for document in page["documents"]:
+                key = document["metadata"].get("text_chunk_key")
+                if key:
+                    index[key] = {
+                        "type": "text",
+                        "page_number": page_number,
+                        "content": document["page_content"],
+                    }
+
+            for table in pages_data.get("translated_tables_summary", []):
+                index[table["key"]] = {
+                    "type": "table",
+                    "page_number": page_number,
+                    "translated_table": table["translated_table"],
+                    "summary": table["summary"],
+                }
+
+            for image in pages_data.get("images", []):
+                index[image["key"]] = {
+                    "type": "image",
+                    "page_number": page_number,
+                    "img_filename": image.get("img_filename"),
+                    "blob_id": image.get("blob_id"),
+                    "caption": image["caption"],
+                }
+
+        # Check and write under the lock, so concurrent jobs of the same
+        # document don't both write its index
+        with self._lock:
+            if not replace and self.has_document(doc_id):
+                return self._load_index(doc_id)
+
+            path = self._index_path(doc_id)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, path)
+            self._indexes[doc_id] = index
+        return index
+
+    def has_document(self, doc_id: str) -> bool:
+        """Checks whether a document has been indexed."""
+        try:
+            return doc_id in self._indexes or os.path.isfile(self._index_path(doc_id))
+        except KeyError:
+            return False
+
+    def get_index(self, doc_id: str) -> dict:
+        """Returns the key index of a document.
+
+        Raises:
+            KeyError: If the document has not been indexed.
+        """
+        with self._lock:
+            if not self.has_document(doc_id):
+                raise KeyError(doc_id)
+            return self._load_index(doc_id)
+
+    def get_item(self, doc_id: str, key: str) -> Optional[dict]:
+        """Returns an indexed item of a document, or None if it is unknown."""
+        try:
+            return self.get_index(doc_id).get(key)
+        except KeyError:
+            return None
+
+    def resolve(self, docs: list) -> list[Optional[dict]]:
+        """Looks up the indexed item of each retrieved vector database document.
+
+        Args:
+            docs (list[Document]): Documents with `doc_id` and item key metadata.
+
+        Returns:
+            list[Optional[dict]]: The item of each document, None when unknown.
+        """
+        items = []
+        for doc in docs:
+            key = (
+                doc.metadata.get("text_chunk_key")
+                or doc.metadata.get("trans_table_summary_key")
+                or doc.metadata.get("image_caption_key")
+            )
+            items.append(self.get_item(doc.metadata.get("doc_id"), key))
+        return items
+
+    def delete_document(self, doc_id: str) -> None:
+        """Removes a document from the store."""
+        if not self.has_document(doc_id):
+            return
+        with self._lock:
+            self._indexes.pop(doc_id, None)
+            if os.path.isfile(self._index_path(doc_id)):
+                os.remove(self._index_path(doc_id))
+
+    def _load_index(self, doc_id: str) -> dict:
+        """Returns the index of an indexed document, reading it on first use.
+
+        Must be called with the lock held.
+        """
+        if doc_id not in self._indexes:
+            with open(self._index_path(doc_id)) as f:
+                self._indexes[doc_id] = json.load(f)
+        return self._indexes[doc_id]
+
+    def _index_path(self, doc_id: str) -> str:
+        """Returns the index file of a document, rejecting IDs that are not plain names."""
+        if not doc_id or os.path.basename(doc_id) != doc_id or doc_id.startswith("."):
+            raise KeyError(doc_id)
+        return os.path.join(self.documents_dir, f"{doc_id}.json")
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterator, Optional
+
+from .BlobStore import BlobStore
+from .DocumentStore import DocumentStore
+from .PDFProcessor import PDFProcessor
+
+
+# Directory where uploaded documents and completed pages are persisted
+JOBS_DIR = os.getenv("JOBS_DIR", "backend/data/jobs")
+
+# Number of documents processed at the same time
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+
+# Jobs in these states are not picked up again on restart
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class JobManager:
+    """Runs document-processing jobs in the background.
+
+    Every job gets its own directory containing the uploaded PDF, a
+    `job.json` status file and one JSON file per completed page. Since
+    completed pages are on disk, a job interrupted by a restart resumes from
+    the first missing page instead of starting over.
+    """
+
+    def __init__(
+        self,
+        jobs_dir: str = JOBS_DIR,
+        max_concurrent_jobs: int = MAX_CONCURRENT_JOBS,
+        document_store: Optional[DocumentStore] = None,
+        blob_store: Optional[BlobStore] = None,
+    ):
+        """
+        Initializes the JobManager.
+
+        Args:
+            jobs_dir (str, optional): Directory for persisted jobs (default: `JOBS_DIR`).
+            max_concurrent_jobs (int, optional): Documents processed at once (default: `MAX_CONCURRENT_JOBS`).
+            document_store (DocumentStore, optional): Store where completed documents are indexed.
+            blob_store (BlobStore, optional): Store for the extracted images (default: a `BlobStore` in `BLOBS_DIR`).
+        """
+        self.jobs_dir = jobs_dir
+        self.document_store = document_store
+        self.blob_store = blob_store or BlobStore()
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._jobs = {}  # Status of each job, keyed by job ID
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs)
+
+    def create_job(self, filename: str, file: BinaryIO) -> dict:
+        """Saves an uploaded PDF and queues it for processing.
+
+        Args:
+            filename (str): Original file name of the upload.
+            file (BinaryIO): File object with the PDF contents.
+
+        Returns:
+            dict: The status of the new job.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        os.makedirs(os.path.join(job_dir, "pages"), exist_ok=True)
+
+        # Save the PDF and hash its contents to identify the document
+        file.seek(0)
+        doc_hash = hashlib.sha256()
+        with open(self._pdf_path(job_id), "wb") as out_file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                doc_hash.update(block)
+                out_file.write(block)
+
+        job = {
+            "job_id": job_id,
+            "doc_id": doc_hash.hexdigest(),
+            "filename": filename,
+            "status": "queued",
+            "num_pages": None,
+            "completed_pages": 0,
+            "error": None,
+            "created_at": time.time(),
+            "updated_at": time.time(),
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._save_job(job)
+
+        self._executor.submit(self._run_job, job_id)
+        return dict(job)
+
+    def resume_jobs(self) -> list[str]:
+        """Re-queues the persisted jobs that did not finish before a restart.
+
+        Returns:
+            list[str]: The IDs of the resumed jobs.
+        """
+        resumed = []
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            job_file = os.path.join(self._job_dir(job_id), "job.json")
+            if not os.path.isfile(job_file):
+                continue
+            with open(job_file) as f:
+                job = json.load(f)
+
+            with self._lock:
+                self._jobs[job_id] = job
+            if job["status"] not in FINISHED_STATUSES:
+                self._executor.submit(self._run_job, job_id)
+                resumed.append(job_id)
+            elif job["status"] == "completed":
+                self._index_document(job_id)
+
+        return resumed
+
+    def get_job(self, job_id: str) -> dict:
+        """Returns the status of a job.
+
+        Raises:
+            KeyError: If the job does not exist.
+        """
+        with self._lock:
+            return dict(self._jobs[job_id])
+
+    def get_pages(self, job_id: str, start: int = 0) -> list[dict]:
+        """Returns the completed pages of a job, in page order.
+
+        Args:
+            job_id (str): The job ID.
+            start (int, optional): Number of completed pages to skip (default: 0).
+
+        Returns:
+            list[dict]: The `pages_data` and `documents` of each completed page.
+
+        Raises:
+            KeyError: If the job does not exist.
+        """
+        self.get_job(job_id)
+        pages = []
+        for page_file in self._page_files(job_id)[start:]:
+            with open(page_file) as f:
+                pages.append(json.load(f))
+        return pages
+
+    def iter_events(self, job_id: str, poll_interval: float = 0.5) -> Iterator[dict]:
+        """Yields a `page` event per completed page and a final `status` event.
+
+        Raises:
+            KeyError: If the job does not exist.
+        """
+        sent = 0
+        while True:
+            job = self.get_job(job_id)
+            for page in self.get_pages(job_id, start=sent):
+                sent += 1
+                yield {"event": "page", "data": page}
+            if job["status"] in FINISHED_STATUSES:
+                yield {"event": "status", "data": job}
+                return
+            time.sleep(poll_interval)
+
+    def _run_job(self, job_id: str) -> None:
+        """Processes the pages of a job that are not persisted yet."""
+
+        processor = None
+        try:
+            processor = PDFProcessor(self._pdf_path(job_id), blob_store=self.blob_store)
+            num_pages = processor.get_pages()
+            done = {
+                int(os.path.basename(page_file).split(".")[0]) - 1
+                for page_file in self._page_files(job_id)
+            }
+            pending = [page for page in range(num_pages) if page not in done]
+            self._update_job(
+                job_id, status="running", num_pages=num_pages, completed_pages=len(done)
+            )
+
+            for pages_data, documents in processor.process_pdf_pages(pending):
+                self._save_page(job_id, pages_data, documents)
+                self._update_job(
+                    job_id,
+                    completed_pages=len(self._page_files(job_id)),
+                    metrics=processor.metrics.summary(),
+                )
+
+            self._index_document(job_id)
+            self._update_job(job_id, status="completed")
+        except Exception as e:
+            print(f"[ERROR] Job {job_id} failed: {e}")
+            self._update_job(job_id, status="failed", error=str(e))
+        finally:
+            if processor is not None:
+                processor.close_pdf()
+
+    def _index_document(self, job_id: str) -> None:
+        """Adds the pages of a completed job to the document store, if missing."""
+        doc_id = self.get_job(job_id).get("doc_id")
+        if self.document_store is None or not doc_id:
+            return
+        if not self.document_store.has_document(doc_id):
+            self.document_store.add_document(
+                doc_id, self.get_pages(job_id), replace=False
+            )
+
+    def _update_job(self, job_id: str, **fields) -> None:
+        """Updates and persists the status of a job."""
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=time.time())
+            self._save_job(job)
+
+    def _save_job(self, job: dict) -> None:
+        """Atomically writes the status file of a job."""
+        self._write_json(os.path.join(self._job_dir(job["job_id"]), "job.json"), job)
+
+    def _save_page(self, job_id: str, pages_data: dict, documents: list) -> None:
+        """Atomically writes a completed page of a job."""
+        page_file = os.path.join(
+            self._job_dir(job_id), "pages", f"{pages_data['page_number']:05d}.json"
+        )
+        self._write_json(page_file, {"pages_data": pages_data, "documents": documents})
+
+    def _page_files(self, job_id: str) -> list[str]:
+        """Lists the completed page files of a job, in page order."""
+        pages_dir = os.path.join(self._job_dir(job_id), "pages")
+        return [
+            os.path.join(pages_dir, file)
+            for file in sorted(os.listdir(pages_dir))
+            if file.endswith(".json")
+        ]
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _pdf_path(self, job_id: str) -> str:
+        return os.path.join(self._job_dir(job_id), "document.pdf")
+
+    @staticmethod
+    def _write_json(path: str, data) -> None:
+        """Writes JSON to a temporary file and moves it into place."""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
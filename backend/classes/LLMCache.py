@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class LLMCache:
+    """A persistent, content-addressed cache for model responses.
+
+    Entries are stored in SQLite, keyed by a hash of everything that
+    determines the response (function, model, messages, temperature, ...),
+    and evicted least-recently-used first once the cache grows past
+    `max_bytes`. Access times are only refreshed once per `touch_interval`,
+    so that most hits are plain reads.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_bytes: int = 512 * 1024 * 1024,
+        touch_interval: float = 60,
+    ):
+        """
+        Initializes the LLMCache.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+            max_bytes (int, optional): Maximum total size of the cached responses (default: 512 MB).
+            touch_interval (float, optional): Seconds before a hit refreshes the access time of an entry (default: 60).
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)"
+        )
+        self._conn.commit()
+        # Total size of the cached responses, kept up to date by `set`
+        (self._total_bytes,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        """Hashes the inputs of a model call into a cache key."""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for a key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, last_access FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            value, last_access = row
+            now = time.time()
+            if now - last_access >= self.touch_interval:
+                self._conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """Stores a response and evicts the least recently used ones if needed."""
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._total_bytes += size - (row[0] if row else 0)
+            self._evict()
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Returns the hit/miss counters and the size of the cache."""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            size = self._total_bytes
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def clear(self) -> None:
+        """Removes every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def _evict(self) -> None:
+        """Deletes least recently used entries until the cache fits `max_bytes`."""
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        evicted = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            if self._total_bytes <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
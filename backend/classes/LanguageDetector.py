@@ -0,0 +1,97 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+
+
+# Texts with fewer letters than this are too short to tell their language
+MIN_DETECTION_LETTERS = int(os.getenv("MIN_DETECTION_LETTERS", "3"))
+
+# A text is English when English words outnumber Malay/Indonesian words by
+# this factor and make up at least `ENGLISH_MIN_WORD_SHARE` of its words
+ENGLISH_MARGIN = float(os.getenv("ENGLISH_MARGIN", "3"))
+ENGLISH_MIN_WORD_SHARE = float(os.getenv("ENGLISH_MIN_WORD_SHARE", "0.2"))
+
+# Frequent words of each Latin-script language, leaving out words shared by
+# both (data, total, status, bank, ...). Malay and Indonesian are one group.
+ENGLISH_WORDS = frozenset(
+    """
+    a about after all also an and any are as at be been before between both but
+    by can could each for from had has have he her his how if in into is it its
+    more most must no not of on only or other our out over per she should so
+    such than that the their them then there these they this those through to
+    under up was we were what when where which while who will with would you
+    your account accounts address amount annual assets balance cash
+    cost costs customer date description dividend equity expense expenses
+    financial gross income interest invoice less liabilities loss month name
+    net number operating paid payment price profit quarter rate received
+    region report revenue sales share shares statement summary tax value year
+    years
+    """.split()
+)
+MALAY_WORDS = frozenset(
+    """
+    ada adalah akan anda antara atas atau bagi bahawa bahwa bawah belum boleh
+    dalam dan dapat dari dengan di hingga ini itu juga kami karena kepada ke
+    kerana kita lain lebih mereka oleh pada para saya sebagai sehingga semua
+    serta setiap sudah telah tersebut tidak untuk yang akaun alamat bahagian
+    bagian bersih bulan catatan cukai harga hari jumlah kasar keterangan
+    kerugian keuangan kewangan keuntungan laporan liabiliti nama negara negeri
+    nilai nombor nomor pajak pelanggan pembayaran pendapatan penerangan penyata
+    perbelanjaan perkara perusahaan ringgit rupiah syarikat tahun tanggal
+    tarikh uang wang
+    """.split()
+)
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+
+def detect_scripts(text: str) -> dict[str, float]:
+    """Returns the share of the letters of a text written in each script.
+
+    Scripts are named after the first word of the Unicode character names,
+    as in "LATIN" or "ARABIC". Returns an empty dict for texts without letters.
+    """
+    scripts = Counter(
+        unicodedata.name(char, "UNKNOWN").split(" ")[0]
+        for char in text
+        if char.isalpha()
+    )
+    letters = sum(scripts.values())
+    return {script: count / letters for script, count in scripts.items()}
+
+
+def detect_language(text: str) -> str:
+    """Identifies the language of a text from its script and frequent words.
+
+    Returns:
+        str: "en" for English, "ms" for Malay/Indonesian, "ar" for Arabic,
+            "other" for other scripts and "und" when the text is too short
+            or has too few known words to tell.
+    """
+    if sum(char.isalpha() for char in text) < MIN_DETECTION_LETTERS:
+        return "und"
+
+    script, share = max(detect_scripts(text).items(), key=lambda item: item[1])
+    if script == "ARABIC":
+        return "ar"
+    if script != "LATIN":
+        return "other"
+    if share < 0.9:
+        # Latin text mixed with another script is not plain English
+        return "und"
+
+    words = WORD_PATTERN.findall(text.lower())
+    english = sum(word in ENGLISH_WORDS for word in words)
+    malay = sum(word in MALAY_WORDS for word in words)
+    if english and english >= ENGLISH_MARGIN * malay:
+        if english / len(words) >= ENGLISH_MIN_WORD_SHARE:
+            return "en"
+    if malay > english:
+        return "ms"
+    return "und"
+
+
+def is_english(text: str) -> bool:
+    """Checks whether a text is confidently English and needs no translation."""
+    return detect_language(text) == "en"
@@ -0,0 +1,242 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+# Pipeline stages whose latency is recorded
+STAGES = (
+    "render",
+    "ocr",
+    "table_extraction",
+    "fuzzy_filter",
+    "translate",
+    "summarize",
+    "caption",
+    "embed",
+    "vectorstore_load",
+    "retrieve",
+    "generate",
+)
+
+# Number of most recent timings per stage used for the percentiles
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "4096"))
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Metrics:
+    """Collects stage timings, token usage and cache hits.
+
+    Timings are kept as exact totals plus a window of recent samples for the
+    percentiles. Everything recorded is also forwarded to `parent`, so a
+    job's metrics add up into the process-wide `METRICS`.
+    """
+
+    def __init__(
+        self, window: int = METRICS_WINDOW, parent: Optional["Metrics"] = None
+    ):
+        """
+        Initializes the Metrics.
+
+        Args:
+            window (int, optional): Recent timings kept per stage (default: `METRICS_WINDOW`).
+            parent (Metrics, optional): Metrics that everything recorded is forwarded to.
+        """
+        self.window = window
+        self.parent = parent
+        self._timings = {}  # stage -> {"count", "total", "samples"}
+        self._tokens = {}  # model -> {"calls", "prompt_tokens", "completion_tokens"}
+        self._cache = {}  # cache name -> {"hits", "misses"}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Records the duration of a stage."""
+        with self._lock:
+            timing = self._timings.setdefault(
+                stage,
+                {"count": 0, "total": 0.0, "samples": deque(maxlen=self.window)},
+            )
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["samples"].append(seconds)
+        if self.parent:
+            self.parent.observe(stage, seconds)
+
+    def record_usage(
+        self, model: str, prompt_tokens: int, completion_tokens: int
+    ) -> None:
+        """Records the tokens used by a model call."""
+        with self._lock:
+            usage = self._tokens.setdefault(
+                model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            )
+            usage["calls"] += 1
+            usage["prompt_tokens"] += prompt_tokens
+            usage["completion_tokens"] += completion_tokens
+        if self.parent:
+            self.parent.record_usage(model, prompt_tokens, completion_tokens)
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        """Records a cache lookup."""
+        with self._lock:
+            counters = self._cache.setdefault(cache, {"hits": 0, "misses": 0})
+            counters["hits" if hit else "misses"] += 1
+        if self.parent:
+            self.parent.record_cache(cache, hit)
+
+    def export(self) -> dict:
+        """Returns the raw timings, e.g. to send them out of a worker process."""
+        with self._lock:
+            return {
+                stage: list(timing["samples"])
+                for stage, timing in self._timings.items()
+            }
+
+    def merge(self, timings: dict) -> None:
+        """Records the timings exported by another `Metrics`."""
+        for stage, samples in timings.items():
+            for seconds in samples:
+                self.observe(stage, seconds)
+
+    def summary(self) -> dict:
+        """Returns the count, total and percentiles of every stage, the token
+        usage per model and the hit rate of every cache."""
+        with self._lock:
+            stages = {}
+            for stage, timing in self._timings.items():
+                stages[stage] = {
+                    "count": timing["count"],
+                    "total_seconds": round(timing["total"], 6),
+                    **{
+                        f"p{round(q * 100)}": round(
+                            self._percentile(timing["samples"], q), 6
+                        )
+                        for q in QUANTILES
+                    },
+                }
+            cache = {
+                name: {
+                    **counters,
+                    "hit_rate": counters["hits"]
+                    / max(counters["hits"] + counters["misses"], 1),
+                }
+                for name, counters in self._cache.items()
+            }
+            tokens = {model: dict(usage) for model, usage in self._tokens.items()}
+        return {"stages": stages, "tokens": tokens, "cache": cache}
+
+    def render_prometheus(self, prefix: str = "omnipdf") -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent in each pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        with self._lock:
+            # Every known stage is exported, so idle stages show up as zero
+            for stage in sorted(set(STAGES) | set(self._timings)):
+                timing = self._timings.get(
+                    stage, {"count": 0, "total": 0.0, "samples": ()}
+                )
+                for q in QUANTILES:
+                    value = self._percentile(timing["samples"], q)
+                    lines.append(
+                        f'{prefix}_stage_seconds{{stage="{stage}",quantile="{q}"}} {value}'
+                    )
+                lines.append(
+                    f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {timing["total"]}'
+                )
+                lines.append(
+                    f'{prefix}_stage_seconds_count{{stage="{stage}"}} {timing["count"]}'
+                )
+
+            lines += [
+                f"# HELP {prefix}_llm_calls_total Model calls made.",
+                f"# TYPE {prefix}_llm_calls_total counter",
+            ]
+            for model, usage in sorted(self._tokens.items()):
+                lines.append(
+                    f'{prefix}_llm_calls_total{{model="{model}"}} {usage["calls"]}'
+                )
+
+            lines += [
+                f"# HELP {prefix}_llm_tokens_total Tokens reported by the model server.",
+                f"# TYPE {prefix}_llm_tokens_total counter",
+            ]
+            for model, usage in sorted(self._tokens.items()):
+                for kind in ("prompt", "completion"):
+                    lines.append(
+                        f'{prefix}_llm_tokens_total{{model="{model}",type="{kind}"}} '
+                        f'{usage[f"{kind}_tokens"]}'
+                    )
+
+            lines += [
+                f"# HELP {prefix}_cache_requests_total Cache lookups by result.",
+                f"# TYPE {prefix}_cache_requests_total counter",
+            ]
+            for name, counters in sorted(self._cache.items()):
+                for result in ("hit", "miss"):
+                    count = counters["hits" if result == "hit" else "misses"]
+                    lines.append(
+                        f'{prefix}_cache_requests_total{{cache="{name}",result="{result}"}} {count}'
+                    )
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _percentile(samples, q: float) -> float:
+        """Returns the nearest-rank percentile of the samples."""
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+# Process-wide metrics, exposed on /metrics
+METRICS = Metrics()
+
+# Metrics of the job or page being processed in the current context
+_current_metrics = contextvars.ContextVar("current_metrics", default=None)
+
+
+def current_metrics() -> Metrics:
+    """Returns the metrics of the current job, or the process-wide ones."""
+    return _current_metrics.get() or METRICS
+
+
+@contextmanager
+def track(metrics: Metrics) -> Iterator[Metrics]:
+    """Records everything measured inside the block into `metrics`."""
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Times the block as one run of a pipeline stage."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_metrics().observe(stage, time.perf_counter() - start_time)
+
+
+def record_usage(model: str, usage) -> None:
+    """Records the `usage` of a model response, if the server sent it."""
+    if usage is not None:
+        current_metrics().record_usage(
+            model,
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+        )
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Records a cache lookup."""
+    current_metrics().record_cache(cache, hit)
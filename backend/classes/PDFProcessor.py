@@ -1,30 +1,166 @@
-import base64
+import contextvars
+import hashlib
+import io
+import multiprocessing
 import os
+import unicodedata
+import threading
 import uuid
-from difflib import SequenceMatcher as SM
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator, Optional
 
 import fitz
+import numpy as np
 import pandas as pd
 import pdfplumber
 import pytesseract
 
 # import streamlit as st
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from pdf2image import convert_from_path
-from PIL import Image
+from PIL import Image, ImageDraw
 
 from .APIRouter import (
-    translate_table,
     translate_text,
-    summarize_table,
+    translate_texts,
+    summarize_tables,
     summarize_text,
     caption_image,
     CLIENT,
+    LLM_CONCURRENCY,
 )
-from .TableDataProcessor import TableDataProcessor
+from .BlobStore import BlobStore
+from .LanguageDetector import detect_language, detect_scripts, is_english
+from .Metrics import METRICS, Metrics, timed, track
+from .TableTranslator import TableTranslator
 
 
-tbp = TableDataProcessor()
+# Number of processes used for the CPU-bound stages of parallel page processing
+PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", os.cpu_count() or 1))
+
+# Documents with fewer pages than this are extracted in-process, where they
+# finish before worker processes would pay off
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+
+# PDFs each page worker process keeps open between tasks
+PAGE_WORKER_OPEN_PDFS = int(os.getenv("PDF_PAGE_WORKER_OPEN_PDFS", "4"))
+
+# Resolution and colour mode of the page rasters handed to Tesseract
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() == "true"
+
+# A page's embedded text layer is used instead of OCR when it has at least
+# this many characters and this share of them is readable
+MIN_TEXT_LAYER_CHARS = int(os.getenv("MIN_TEXT_LAYER_CHARS", "20"))
+MIN_TEXT_LAYER_QUALITY = float(os.getenv("MIN_TEXT_LAYER_QUALITY", "0.9"))
+
+# Images covering at least this share of a text-layer page are still OCRed,
+# smaller ones are considered decorative
+MIN_OCR_IMAGE_AREA = float(os.getenv("MIN_OCR_IMAGE_AREA", "0.2"))
+
+# Blank out decorative images before OCRing a scanned page
+OCR_SKIP_DECORATIVE_IMAGES = (
+    os.getenv("OCR_SKIP_DECORATIVE_IMAGES", "true").lower() == "true"
+)
+
+# Threads running Tesseract on the text bands of a page in parallel
+OCR_REGION_WORKERS = int(os.getenv("OCR_REGION_WORKERS", "4"))
+
+# Text regions are split into bands at blank gaps at least this high, in points
+OCR_BAND_GAP = float(os.getenv("OCR_BAND_GAP", "8"))
+
+# Embedded images smaller than this many pixels on a side, or more elongated
+# than this aspect ratio, are decorative (spacers, rules, bullets) and skipped
+MIN_CAPTION_IMAGE_SIZE = int(os.getenv("MIN_CAPTION_IMAGE_SIZE", "32"))
+MAX_CAPTION_IMAGE_ASPECT = float(os.getenv("MAX_CAPTION_IMAGE_ASPECT", "10"))
+
+# Images of a page captioned concurrently
+CAPTION_CONCURRENCY = int(os.getenv("CAPTION_CONCURRENCY", "4"))
+
+# Images of a document whose perceptual hashes differ in at most this many
+# bits are considered the same image and share one caption
+IMAGE_HASH_DISTANCE = int(os.getenv("IMAGE_HASH_DISTANCE", "4"))
+
+# OCR lines whose character trigrams overlap a table row at least this much
+# (Dice coefficient) are treated as table text
+TABLE_TEXT_SIMILARITY = float(os.getenv("TABLE_TEXT_SIMILARITY", "0.7"))
+
+# Skip translating English text and OCR pages with the languages of the
+# scripts they are written in only
+DETECT_LANGUAGES = os.getenv("DETECT_LANGUAGES", "true").lower() == "true"
+
+# Script of each Tesseract language, and the share of a page's letters a
+# script needs for its languages to be used
+OCR_LANGUAGE_SCRIPTS = {
+    "eng": "LATIN",
+    "ara": "ARABIC",
+    "id": "LATIN",
+    "ind": "LATIN",
+    "ms": "LATIN",
+    "msa": "LATIN",
+}
+MIN_OCR_SCRIPT_SHARE = float(os.getenv("MIN_OCR_SCRIPT_SHARE", "0.05"))
+
+# Process pool shared by every document, started on first use since each
+# worker has to import the whole backend
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+# PDFProcessors opened by a page worker process, least recently used first
+_page_worker_processors = OrderedDict()
+
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    """Returns the shared page pool, starting it if needed."""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(
+                max_workers=PAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _page_pool
+
+
+def shutdown_page_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """Stops the shared page pool, so the next document starts a new one.
+
+    Args:
+        pool (ProcessPoolExecutor, optional): Only stop the pool if it is still
+            this one, e.g. after it broke (default: whatever pool is running).
+    """
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None or (pool is not None and pool is not _page_pool):
+            return
+        _page_pool.shutdown(wait=False, cancel_futures=True)
+        _page_pool = None
+
+
+def _extract_page_in_worker(
+    pdf_path: str, processor_kwargs: dict, page_number: int
+) -> dict:
+    """Runs the CPU-bound stages of a page inside a worker process.
+
+    The last `PAGE_WORKER_OPEN_PDFS` PDFs stay open, so the pages of a
+    document don't reopen it. They are keyed by the file's size and
+    modification time too, in case a path is reused for another PDF.
+    """
+    stat = os.stat(pdf_path)
+    key = (
+        pdf_path,
+        stat.st_size,
+        stat.st_mtime_ns,
+        tuple(sorted(processor_kwargs.items())),
+    )
+    processor = _page_worker_processors.pop(key, None)
+    if processor is None:
+        processor = PDFProcessor(pdf_path, **processor_kwargs)
+    _page_worker_processors[key] = processor
+    while len(_page_worker_processors) > PAGE_WORKER_OPEN_PDFS:
+        _page_worker_processors.popitem(last=False)[1].close_pdf()
+    return processor._extract_page_content(page_number)
 
 
 class PDFProcessor:
@@ -32,13 +168,29 @@ class PDFProcessor:
     A class to process PDFs by extracting images, text, and tables per page.
     """
 
-    def __init__(self, pdf_path, ocr_languages="eng+ara+id+ms"):
+    def __init__(
+        self,
+        pdf_path,
+        ocr_languages="eng+ara+id+ms",
+        ocr_dpi=OCR_DPI,
+        ocr_grayscale=OCR_GRAYSCALE,
+        ocr_region_workers=OCR_REGION_WORKERS,
+        skip_decorative_images=OCR_SKIP_DECORATIVE_IMAGES,
+        blob_store=None,
+        detect_languages=DETECT_LANGUAGES,
+    ):
         """
         Initializes the PDFProcessor.
 
         Args:
             pdf_path (str): Path to the PDF file.
             ocr_languages (str, optional): Languages for OCR (default: "eng+ara+id+ms").
+            ocr_dpi (int, optional): Resolution pages are rendered at for OCR (default: `OCR_DPI`).
+            ocr_grayscale (bool, optional): Render pages in grayscale for OCR (default: `OCR_GRAYSCALE`).
+            ocr_region_workers (int, optional): Text bands OCRed in parallel (default: `OCR_REGION_WORKERS`).
+            skip_decorative_images (bool, optional): Leave small images out of OCR (default: `OCR_SKIP_DECORATIVE_IMAGES`).
+            blob_store (BlobStore, optional): Store for the extracted images (default: a `BlobStore` in `BLOBS_DIR`).
+            detect_languages (bool, optional): Skip translating English and narrow the OCR languages (default: `DETECT_LANGUAGES`).
         """
         self.pdf_path = pdf_path
         if not os.path.exists(pdf_path):
@@ -52,18 +204,30 @@ class PDFProcessor:
         except Exception as e:
             print(f"Error opening PDF file as pdfplumber: {e}")
         self.ocr_languages = ocr_languages
+        self.ocr_dpi = ocr_dpi
+        self.ocr_grayscale = ocr_grayscale
+        self.ocr_region_workers = ocr_region_workers
+        self.skip_decorative_images = skip_decorative_images
+        self.blob_store = blob_store or BlobStore()
+        self.detect_languages = detect_languages
+        # Shares cell translations across the pages of the document
+        self.table_translator = TableTranslator(CLIENT, skip_english=detect_languages)
         self.pages_data = []  # Stores extracted data for each page
         self.documents = []  # Stores documents for RAG
-        self._initial_cleanup()
+        self.metrics = Metrics(parent=METRICS)  # Stage timings of this document
+        self._captioned_images = []  # Images captioned so far, to reuse captions
+        self._captioned_images_lock = threading.Lock()
         # self._process_pdf()
-        # self._extract_images()  # Extract images after processing text and tables
 
     def get_pages(self):
         return len(self.pdf.pages)
 
     def close_pdf(self):
-        if self.pdf:
+        """Closes the pdfplumber and PyMuPDF handles of the PDF."""
+        if getattr(self, "pdf", None):
             self.pdf.close()
+        if getattr(self, "pdf_for_images", None):
+            self.pdf_for_images.close()
 
     def process_pdf_page(self, page_number: int) -> tuple[dict, list]:
         """Extracts pages data and documents.
@@ -72,32 +236,274 @@ class PDFProcessor:
         for each page.
         """
 
+        extracted = self._extract_page_content(page_number)
+        with track(self.metrics):
+            pages_data, documents = self._enrich_page_content(page_number, extracted)
+
+        # Close pdf at the end
+        if page_number == self.get_pages():
+            self.close_pdf()
+
+        return pages_data, documents
+
+    def process_pdf_pages(
+        self,
+        page_numbers: Optional[Iterable[int]] = None,
+        llm_concurrency: Optional[int] = None,
+        progress_callback: Optional[Callable[[int, int, int], None]] = None,
+    ) -> Iterator[tuple[dict, list]]:
+        """Processes pages in parallel and yields the results in page order.
+
+        The CPU-bound stages (rendering, OCR, table and image extraction) are
+        fanned out across the shared page pool of `PAGE_WORKERS` processes,
+        while the model calls (translation, summaries and captions) run on a
+        separate, smaller thread pool. Fewer than `PARALLEL_MIN_PAGES` pages
+        are extracted in-process, one at a time, instead.
+
+        Args:
+            page_numbers (Iterable[int], optional): 0-based pages to process (default: all pages).
+            llm_concurrency (int, optional): Pages enriched concurrently (default: `LLM_CONCURRENCY`).
+            progress_callback (Callable, optional): Called with (completed, total, page_number)
+                after each page is yielded.
+
+        Yields:
+            tuple[dict, list]: The pages data and documents of each page.
+        """
+        if page_numbers is None:
+            page_numbers = range(self.get_pages())
+        page_numbers = list(page_numbers)
+        total = len(page_numbers)
+
+        if total >= PARALLEL_MIN_PAGES:
+            cpu_pool = _get_page_pool()
+            processor_kwargs = {
+                "ocr_languages": self.ocr_languages,
+                "ocr_dpi": self.ocr_dpi,
+                "ocr_grayscale": self.ocr_grayscale,
+                # Pages are already OCRed in parallel across processes
+                "ocr_region_workers": 1,
+                "skip_decorative_images": self.skip_decorative_images,
+                "detect_languages": self.detect_languages,
+            }
+
+            def submit_extraction(page_number: int) -> Future:
+                return cpu_pool.submit(
+                    _extract_page_in_worker,
+                    self.pdf_path,
+                    processor_kwargs,
+                    page_number,
+                )
+
+        else:
+            # The PDF handles of this processor are not thread-safe, so the
+            # pages are extracted one at a time
+            cpu_pool = ThreadPoolExecutor(max_workers=1)
+
+            def submit_extraction(page_number: int) -> Future:
+                return cpu_pool.submit(self._extract_page_content, page_number)
+
+        llm_pool = ThreadPoolExecutor(max_workers=llm_concurrency or LLM_CONCURRENCY)
+        extract_futures, enrich_futures = [], []
+        try:
+            extract_futures = [
+                submit_extraction(page_number) for page_number in page_numbers
+            ]
+            # Each enrichment waits on its own extraction, so pages flow from
+            # the CPU pool into the LLM pool in the order they were submitted
+            enrich_futures = [
+                llm_pool.submit(
+                    self._enrich_page_future, page_number, extract_future
+                )
+                for page_number, extract_future in zip(page_numbers, extract_futures)
+            ]
+
+            for completed, (page_number, future) in enumerate(
+                zip(page_numbers, enrich_futures), start=1
+            ):
+                result = future.result()
+                if progress_callback:
+                    progress_callback(completed, total, page_number)
+                yield result
+        except BrokenProcessPool:
+            # A worker died, replace the pool for the next document
+            shutdown_page_pool(cpu_pool)
+            raise
+        finally:
+            # On a failed page or a consumer that stopped reading, drop the
+            # pages not started yet instead of processing them for nothing
+            for future in enrich_futures + extract_futures:
+                future.cancel()
+            llm_pool.shutdown(wait=False, cancel_futures=True)
+            if isinstance(cpu_pool, ThreadPoolExecutor):
+                cpu_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _extract_page_content(self, page_number: int) -> dict:
+        """Runs the CPU-bound stages of a page: tables, text and embedded images.
+
+        The stage timings are returned under "timings", since this may run in
+        a worker process whose metrics are not the caller's.
+        """
+
+        page_metrics = Metrics()
+        with track(page_metrics):
+            # Get page content
+            page_content = self.pdf.pages[page_number]
+
+            # Extract tables and the regions they cover
+            with timed("table_extraction"):
+                tables, table_regions = self._find_tables(page_content)
+            # Extract the text outside the tables from the embedded text
+            # layer, or from images (OCR) for scanned pages
+            filtered_text, text_source = self._extract_page_text(
+                page_number, tables, table_regions
+            )
+
+        return {
+            "text": filtered_text,
+            "text_source": text_source,
+            "tables": tables,
+            "embedded_images": self._extract_image_bytes(page_number),
+            "timings": page_metrics.export(),
+        }
+
+    def _extract_page_text(
+        self, page_number: int, tables: list = (), table_regions: list = ()
+    ) -> tuple[str, str]:
+        """Extracts the text of a page outside its tables, only running OCR
+        where it is needed.
+
+        Born-digital pages use their embedded text layer, plus OCR of any large
+        images on the page with the words of the text layer blanked out.
+        Images the text layer already covers, like the page image of a
+        searchable scan, are not OCRed. Pages without a usable text layer are
+        OCRed whole, except for their decorative images if
+        `skip_decorative_images` is set.
+        Tables with extracted text are left out of the OCR, and words of the
+        text layer inside `table_regions` are dropped. Remaining OCR lines are
+        dropped when they fuzzily match a row of `tables`.
+
+        Returns:
+            tuple[str, str]: The text and its source: "text_layer",
+                "text_layer+ocr" or "ocr".
+        """
+        page = self.pdf_for_images[page_number]
+        text_layer = page.get_text().strip()
+
+        # Lay out the page: tables whose text was extracted never need OCR,
+        # and only large images may hold text
+        table_rects = self._to_page_rects(
+            page,
+            [
+                region
+                for table, region in zip(tables, table_regions)
+                if any(cell for row in table for cell in row)
+            ],
+        )
+        text_images, decorative_images = self._image_regions(page)
+
+        if not self._is_text_layer_usable(text_layer):
+            masks = table_rects + (
+                decorative_images if self.skip_decorative_images else []
+            )
+            # The broken text layer and the table text hint at the languages
+            hint_text = "\n".join(
+                [text_layer]
+                + [
+                    str(cell)
+                    for table in tables
+                    for row in table
+                    for cell in row
+                    if cell
+                ]
+            )
+            ocr_text = self._ocr_regions(page_number, [page.rect], masks, hint_text)
+            return self._remove_table_text(tables, ocr_text), "ocr"
+
+        if table_rects:
+            with timed("fuzzy_filter"):
+                text_layer = self._text_outside_regions(page, table_rects)
+
+        # OCR only the image-only regions large enough to hold text, without
+        # the text the text layer already has
+        words = page.get_text("words")
+        text_images = [
+            rect for rect in text_images if not self._is_covered_by_words(rect, words)
+        ]
+        if not text_images:
+            return text_layer, "text_layer"
+
+        region_text = self._remove_table_text(
+            tables,
+            self._ocr_regions(
+                page_number,
+                text_images,
+                table_rects + [fitz.Rect(word[:4]) for word in words],
+                text_layer,
+            ),
+        )
+        if not region_text:
+            return text_layer, "text_layer"
+        return f"{text_layer}\n{region_text}", "text_layer+ocr"
+
+    @staticmethod
+    def _is_text_layer_usable(text: str) -> bool:
+        """Checks whether an embedded text layer can be used instead of OCR.
+
+        Unmapped glyphs (U+FFFD), private-use and control characters, and Arabic
+        presentation forms (a sign of visually ordered, broken extraction)
+        count as unreadable.
+        """
+        chars = [char for char in text if not char.isspace()]
+        if len(chars) < MIN_TEXT_LAYER_CHARS:
+            return False
+
+        unreadable = sum(
+            1
+            for char in chars
+            if char == "\ufffd"
+            or unicodedata.category(char) in ("Cc", "Co", "Cs", "Cn")
+            or "\ufb50" <= char <= "\ufdff"
+            or "\ufe70" <= char <= "\ufeff"
+        )
+        return 1 - unreadable / len(chars) >= MIN_TEXT_LAYER_QUALITY
+
+    def _enrich_page_future(self, page_number: int, extract_future) -> tuple[dict, list]:
+        """Waits for a page extraction submitted to the process pool and enriches it."""
+        extracted = extract_future.result()
+        with track(self.metrics):
+            return self._enrich_page_content(page_number, extracted)
+
+    def _enrich_page_content(self, page_number: int, extracted: dict) -> tuple[dict, list]:
+        """Runs the model-calling stages of a page: translation, summaries and captions."""
+
+        # Record the timings of the extraction stages
+        self.metrics.merge(extracted.get("timings", {}))
+
         # Store pages data and documents
         pages_data = {}
         documents = []
 
-        # Get page content
-        page_content = self.pdf.pages[page_number]
-
-        # Extract tables
-        tables = self._extract_tables(page_content)
-        # Convert PDF page into PNG for OCR purposes
-        page_images = self._convert_page_to_images(page_number)
-        # Extract text from images (OCR)
-        raw_text = self._extract_text_from_images(page_images)
-        if raw_text and tables:
-            # Remove table text from the extracted text
-            filtered_text = self._remove_fuzzy_match(tables=tables, raw_text=raw_text)
-        else:
-            filtered_text = raw_text
+        filtered_text = extracted["text"]
+        tables = extracted["tables"]
 
         # Split the filtered text into chunks for better translation
         text_splitter = RecursiveCharacterTextSplitter(chunk_size=1024)
         text_chunks = text_splitter.split_text(filtered_text)
 
+        # Translate the chunks that are not already English in as few
+        # batched requests as possible
+        foreign = [
+            idx
+            for idx, text_chunk in enumerate(text_chunks)
+            if not (self.detect_languages and is_english(text_chunk))
+        ]
+        translated_text_chunks = list(text_chunks)
+        translations = translate_texts([text_chunks[idx] for idx in foreign], CLIENT)
+        for idx, translation in zip(foreign, translations):
+            translated_text_chunks[idx] = translation
+
         translated_text = ""
-        for chunk_idx, text_chunk in enumerate(text_chunks):
-            translated_text_chunk = translate_text(text_chunk, CLIENT)
+        for chunk_idx, translated_text_chunk in enumerate(translated_text_chunks):
             translated_text += translated_text_chunk
 
             # Add text documents
@@ -111,12 +517,16 @@ class PDFProcessor:
                 }
             )
 
-        # Translate tables and summarize translated tables
+        # Translate the distinct table cells and summarize the rebuilt tables
+        # in as few batched requests as possible
+        translated_tables = self.table_translator.translate_tables(tables)
+        summaries = summarize_tables(translated_tables, CLIENT)
+
         translated_tables_summary = []
-        for table_idx, table in enumerate(tables):
+        for table_idx, (translated_table, summary) in enumerate(
+            zip(translated_tables, summaries)
+        ):
             key = f"trans_table_summary_{page_number + 1}_{table_idx + 1}"
-            translated_table = translate_table(tbp.format_for_json(table), CLIENT)
-            summary = summarize_table(translated_table, CLIENT)
             translated_tables_summary.append(
                 {
                     "key": key,
@@ -136,8 +546,10 @@ class PDFProcessor:
                 }
             )
 
-        # Extract images
-        images, image_documents = self._extract_images(page_number)
+        # Caption images
+        images, image_documents = self._caption_images(
+            page_number, extracted["embedded_images"]
+        )
 
         # Add image documents
         documents.extend(image_documents)
@@ -146,19 +558,13 @@ class PDFProcessor:
         pages_data = {
             "page_number": page_number + 1,
             "text": filtered_text,
+            "text_source": extracted["text_source"],
             "translated_text": translated_text,
             "tables": tables,
             "translated_tables_summary": translated_tables_summary,
             "images": images,
         }
 
-        # Clean up temporary images
-        self._cleanup_images(page_images)
-
-        # Close pdf at the end
-        if page_number == self.get_pages():
-            self.close_pdf()
-
         return pages_data, documents
 
     def _process_pdf(self):
@@ -169,7 +575,7 @@ class PDFProcessor:
             for page_number, page in enumerate(pdf.pages):
                 # Extract tables from the page
                 tables = self._extract_tables(page)
-                # Convert PDF page into PNG for OCR purposes
+                # Render PDF page in memory for OCR purposes
                 page_images = self._convert_page_to_images(page_number)
                 # Extract text from images (OCR)
                 raw_text = self._extract_text_from_images(page_images)
@@ -202,13 +608,14 @@ class PDFProcessor:
                     )
 
                 # Translate tables and summarize translated tables
+                translated_tables = self.table_translator.translate_tables(tables)
+                summaries = summarize_tables(translated_tables, CLIENT)
+
                 translated_tables_summary = []
-                for table_idx, table in enumerate(tables):
+                for table_idx, (translated_table, summary) in enumerate(
+                    zip(translated_tables, summaries)
+                ):
                     key = f"trans_table_summary_{page_number + 1}_{table_idx + 1}"
-                    translated_table = translate_table(
-                        tbp.format_for_json(table), CLIENT
-                    )
-                    summary = summarize_table(translated_table, CLIENT)
                     translated_tables_summary.append(
                         {
                             "key": key,
@@ -240,9 +647,6 @@ class PDFProcessor:
                     }
                 )
 
-                # Clean up temporary images
-                self._cleanup_images(page_images)
-
                 # Update progress bar
                 prog = (page_number + 1) / len(pdf.pages)
                 if page_number == len(pdf.pages):
@@ -256,191 +660,477 @@ class PDFProcessor:
         """Extracts tables as structured data."""
         return [pd.DataFrame(table).values.tolist() for table in page.extract_tables()]
 
-    def _convert_page_to_images(self, page_number: int) -> list:
-        """Converts a PDF page to an image using pdf2image."""
-        img_dir = "backend/ocr_pdf"
-        os.makedirs(img_dir, exist_ok=True)
+    def _find_tables(self, page) -> tuple[list, list]:
+        """Extracts tables as structured data, along with their bounding boxes."""
+        found_tables = page.find_tables()
+        tables = [
+            pd.DataFrame(table.extract()).values.tolist() for table in found_tables
+        ]
+        return tables, [table.bbox for table in found_tables]
+
+    @staticmethod
+    def _to_page_rects(page: fitz.Page, regions: list) -> list[fitz.Rect]:
+        """Shifts pdfplumber bounding boxes into fitz page coordinates."""
+        offset = page.cropbox_position
+        return [
+            fitz.Rect(region) - (offset.x, offset.y, offset.x, offset.y)
+            for region in regions
+        ]
+
+    @staticmethod
+    def _image_regions(page: fitz.Page) -> tuple[list, list]:
+        """Splits the embedded images of a page into those large enough to
+        hold text and decorative ones, by the share of the page they cover."""
+        text_images, decorative_images = [], []
+        for info in page.get_image_info():
+            rect = fitz.Rect(info["bbox"]) & page.rect
+            if rect.is_empty:
+                continue
+            if rect.get_area() >= MIN_OCR_IMAGE_AREA * page.rect.get_area():
+                text_images.append(rect)
+            else:
+                decorative_images.append(rect)
+        return text_images, decorative_images
+
+    @staticmethod
+    def _is_covered_by_words(rect: fitz.Rect, words: list) -> bool:
+        """Checks whether the text layer already holds the text of an image
+        region, as in searchable scans where an invisible OCR text layer lies
+        over the page image.
 
-        page_images = []
-        pages = convert_from_path(
-            self.pdf_path, first_page=page_number + 1, last_page=page_number + 1
+        Args:
+            rect (fitz.Rect): The image region.
+            words (list): The words of the text layer, from `get_text("words")`.
+        """
+        chars = sum(
+            len(word[4])
+            for word in words
+            if fitz.Point((word[0] + word[2]) / 2, (word[1] + word[3]) / 2) in rect
         )
+        return chars >= MIN_TEXT_LAYER_CHARS
 
-        for idx, img in enumerate(pages):
-            img_path = os.path.join(
-                img_dir, f"temp_page_{page_number + 1}_{idx + 1}.png"
-            )
-            img.save(img_path, "PNG")
-            page_images.append(img_path)
+    @staticmethod
+    def _text_outside_regions(page: fitz.Page, rects: list[fitz.Rect]) -> str:
+        """Returns the text layer of a page without the words inside `rects`.
 
-        return page_images
-
-    def _extract_images(self, page_number: int) -> tuple[list, list]:
-        """Extracts embedded images from a PDF page and saves them as PNGs."""
+        A word belongs to a region when its center lies inside it.
+        """
+        lines = {}
+        for x0, y0, x1, y1, word, block_no, line_no, _ in page.get_text(
+            "words", sort=True
+        ):
+            center = fitz.Point((x0 + x1) / 2, (y0 + y1) / 2)
+            if not any(center in rect for rect in rects):
+                lines.setdefault((block_no, line_no), []).append(word)
+        return "\n".join(" ".join(words) for words in lines.values()).strip()
+
+    def _convert_page_to_images(
+        self, page_number: int, clip: Optional[fitz.Rect] = None
+    ) -> list[Image.Image]:
+        """Renders a PDF page, or the `clip` region of it, to an in-memory image
+        using the open fitz document."""
+        page = self.pdf_for_images[page_number]
+        with timed("render"):
+            pixmap = page.get_pixmap(
+                dpi=self.ocr_dpi,
+                colorspace=fitz.csGRAY if self.ocr_grayscale else fitz.csRGB,
+                alpha=False,
+                clip=clip,
+            )
+            mode = "L" if pixmap.n == 1 else "RGB"
+            return [
+                Image.frombytes(mode, (pixmap.width, pixmap.height), pixmap.samples)
+            ]
 
-        img_dir = "backend/extracted_images"
-        os.makedirs(img_dir, exist_ok=True)
+    def _extract_image_bytes(self, page_number: int) -> list[dict]:
+        """Extracts the raw bytes of the embedded images on a PDF page.
 
-        # Store pages data and documents
-        images = []
-        image_documents = []
+        Decorative images are skipped. Every image gets a content hash and a
+        perceptual hash, used to caption each distinct image only once.
+        """
 
-        # Extract images
+        embedded_images = []
         page = self.pdf_for_images[page_number]
         for img_index, img_obj in enumerate(page.get_images(full=True)):
             xref = img_obj[0]
             base_image = self.pdf_for_images.extract_image(xref)
+            if self._is_decorative_image(base_image["width"], base_image["height"]):
+                continue
             img_bytes = base_image["image"]
-            img_filename = f"embedded_page_{page_number + 1}_{img_index + 1}.png"
-            img_path = f"{img_dir}/{img_filename}"
-            with open(img_path, "wb") as f:
-                f.write(img_bytes)
-            print(f"✅ Successfully extracted: {img_path}")
-
-            key = f"image_caption_{page_number + 1}_{img_index + 1}"
-            caption = caption_image(img_path, CLIENT)
-            img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-
-            # Add image documents
-            image_documents.append(
+            embedded_images.append(
                 {
-                    "page_content": caption,
-                    "metadata": {
-                        "image_caption_key": key,
-                        "type": "image",
-                    },
+                    "img_index": img_index,
+                    "xref": xref,
+                    "img_bytes": img_bytes,
+                    "sha256": hashlib.sha256(img_bytes).hexdigest(),
+                    "phash": self._perceptual_hash(img_bytes),
                 }
             )
 
+        return embedded_images
+
+    @staticmethod
+    def _is_decorative_image(width: int, height: int) -> bool:
+        """Checks whether an image is too small or elongated to be worth a caption."""
+        if min(width, height) < MIN_CAPTION_IMAGE_SIZE:
+            return True
+        return max(width, height) / min(width, height) > MAX_CAPTION_IMAGE_ASPECT
+
+    @staticmethod
+    def _perceptual_hash(img_bytes: bytes) -> Optional[int]:
+        """Computes the 64-bit difference hash of an image, None if unreadable.
+
+        Each bit tells whether a pixel of the 9x8 grayscale thumbnail is
+        brighter than its right neighbour, so re-encoded or rescaled copies of
+        an image get the same or a very close hash.
+        """
+        try:
+            with Image.open(io.BytesIO(img_bytes)) as image:
+                pixels = list(image.convert("L").resize((9, 8)).getdata())
+        except Exception:
+            return None
+        bits = 0
+        for row in range(8):
+            for col in range(8):
+                left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+                bits = (bits << 1) | (left > right)
+        return bits
+
+    def _caption_once(
+        self, embedded_image: dict, key: str
+    ) -> tuple[str, Optional[str]]:
+        """Captions an image, unless the same image was already captioned.
+
+        An image is the same as one captioned earlier in the document if it
+        has the same xref, the same content hash or a perceptual hash within
+        `IMAGE_HASH_DISTANCE` bits. Pages running concurrently wait for the
+        caption of the first occurrence instead of requesting it again.
+
+        Returns:
+            tuple[str, Optional[str]]: The caption, and the key of the image
+                whose caption was reused (None if the image was captioned).
+        """
+        with self._captioned_images_lock:
+            original = next(
+                (
+                    captioned
+                    for captioned in self._captioned_images
+                    if self._is_same_image(captioned, embedded_image)
+                ),
+                None,
+            )
+            if original is None:
+                caption = Future()
+                self._captioned_images.append(
+                    {
+                        "key": key,
+                        "xref": embedded_image["xref"],
+                        "sha256": embedded_image["sha256"],
+                        "phash": embedded_image["phash"],
+                        "caption": caption,
+                    }
+                )
+
+        if original is not None:
+            return original["caption"].result(), original["key"]
+
+        try:
+            caption.set_result(caption_image(embedded_image["img_bytes"], CLIENT))
+        except Exception as e:
+            caption.set_exception(e)
+        return caption.result(), None
+
+    @staticmethod
+    def _is_same_image(captioned: dict, embedded_image: dict) -> bool:
+        if captioned["xref"] == embedded_image["xref"]:
+            return True
+        if captioned["sha256"] == embedded_image["sha256"]:
+            return True
+        if captioned["phash"] is None or embedded_image["phash"] is None:
+            return False
+        distance = bin(captioned["phash"] ^ embedded_image["phash"]).count("1")
+        return distance <= IMAGE_HASH_DISTANCE
+
+    def _caption_images(
+        self, page_number: int, embedded_images: list[dict]
+    ) -> tuple[list, list]:
+        """Captions the extracted images of a page.
+
+        Images are captioned straight from their bytes, up to
+        `CAPTION_CONCURRENCY` at a time. Repeated images (logos, letterheads,
+        watermarks) reuse the caption of their first occurrence, recorded as
+        `duplicate_of`, and are only added to the documents once.
+
+        The image bytes go to the blob store, and the pages data only
+        references them by blob ID and URL.
+        """
+
+        keys = [
+            f"image_caption_{page_number + 1}_{embedded_image['img_index'] + 1}"
+            for embedded_image in embedded_images
+        ]
+        if len(embedded_images) <= 1:
+            captions = [
+                self._caption_once(embedded_image, key)
+                for embedded_image, key in zip(embedded_images, keys)
+            ]
+        else:
+            with ThreadPoolExecutor(max_workers=CAPTION_CONCURRENCY) as pool:
+                # Copy the context so the timings go to this document's metrics
+                futures = [
+                    pool.submit(
+                        contextvars.copy_context().run,
+                        self._caption_once,
+                        embedded_image,
+                        key,
+                    )
+                    for embedded_image, key in zip(embedded_images, keys)
+                ]
+                captions = [future.result() for future in futures]
+
+        # Store pages data and documents
+        images = []
+        image_documents = []
+
+        for embedded_image, key, (caption, duplicate_of) in zip(
+            embedded_images, keys, captions
+        ):
+            img_index = embedded_image["img_index"]
+            img_filename = f"embedded_page_{page_number + 1}_{img_index + 1}.png"
+            blob_id = self.blob_store.put(embedded_image["img_bytes"])
+
+            # Add image documents
+            if duplicate_of is None:
+                image_documents.append(
+                    {
+                        "page_content": caption,
+                        "metadata": {
+                            "image_caption_key": key,
+                            "type": "image",
+                        },
+                    }
+                )
+
             # Store image data in pages_data
             images.append(
                 {
                     "key": key,
                     "img_filename": img_filename,
-                    "image_url": img_path,
-                    "img_b64": img_b64,
+                    "blob_id": blob_id,
+                    "url": f"/blobs/{blob_id}",
                     "caption": caption,
+                    "duplicate_of": duplicate_of,
                 }
             )
 
-        # Close the pdf for images at the end
-        if page_number == len(self.pdf_for_images):
-            self.pdf_for_images.close()
-
         return images, image_documents
 
-    # def _extract_images(self) -> None:
-    #     """Extracts embedded images from a PDF page and saves them as PNGs."""
-    #     img_dir = "backend/extracted_images"
-    #     os.makedirs(img_dir, exist_ok=True)
-    #     doc = fitz.open(self.pdf_path)
-    #     # progress_bar = st.progress(0, "Processing Images")  # Initialize progress bar
-    #     for page_number in range(len(doc)):
-    #         page = doc[page_number]
-    #         for img_index, img_obj in enumerate(page.get_images(full=True)):
-    #             xref = img_obj[0]
-    #             base_image = doc.extract_image(xref)
-    #             img_bytes = base_image["image"]
-    #             img_path = (
-    #                 f"{img_dir}/embedded_page_{page_number + 1}_{img_index + 1}.png"
-    #             )
-    #             with open(img_path, "wb") as f:
-    #                 f.write(img_bytes)
-    #             print(f"✅ Successfully extracted: {img_path}")
-
-    #             key = f"image_caption_{page_number + 1}_{img_index + 1}"
-    #             caption = caption_image(img_path, CLIENT)
-
-    #             # Add image documents
-    #             self.documents.append(
-    #                 {
-    #                     "page_content": caption,
-    #                     "metadata": {
-    #                         "image_caption_key": key,
-    #                         "type": "image",
-    #                     },
-    #                 }
-    #             )
-
-    #             # Store image data in pages_data
-    #             self.pages_data[page_number]["images"].append(
-    #                 {
-    #                     "key": key,
-    #                     "image_url": img_path,
-    #                     "image_bytes": img_bytes,
-    #                     "caption": caption,
-    #                 }
-    #             )
-
-    #         # Update progress bar
-    #         prog = (page_number + 1) / len(doc)
-    #         if page_number == len(doc):
-    #             prog = 1
-
-    # progress_bar.progress(
-    #     prog, f"{page_number + 1}/{len(doc)} Page Processed (Images)"
-    # )
+    def _ocr_regions(
+        self,
+        page_number: int,
+        regions: list[fitz.Rect],
+        masks: list[fitz.Rect],
+        hint_text: str = "",
+    ) -> str:
+        """OCRs regions of a page with the `masks` blanked out.
+
+        The regions are cut into bands of text, which are OCRed in parallel
+        on up to `ocr_region_workers` threads, with the languages selected
+        from `hint_text` (text already known on the page).
+        """
+        bands = [
+            band
+            for region in regions
+            for band in self._text_bands(page_number, region, masks)
+        ]
+        if not bands:
+            return ""
+        with timed("ocr"):
+            languages = self._select_ocr_languages(hint_text, bands)
+            if len(bands) <= 1 or self.ocr_region_workers <= 1:
+                texts = [self._ocr_image(band, languages) for band in bands]
+            else:
+                with ThreadPoolExecutor(max_workers=self.ocr_region_workers) as pool:
+                    texts = list(
+                        pool.map(self._ocr_image, bands, [languages] * len(bands))
+                    )
+        return "\n".join(text for text in texts if text).strip()
+
+    def _select_ocr_languages(self, hint_text: str, bands: list[Image.Image]) -> str:
+        """Narrows `ocr_languages` down to the scripts a page is written in.
+
+        The scripts come from `hint_text` when it has enough letters, or else
+        from Tesseract's script detection on the largest band. English text
+        is OCRed without the other Latin-script languages, and every language
+        is used when the scripts cannot be told.
+
+        Returns:
+            str: The Tesseract languages, joined by "+".
+        """
+        if not self.detect_languages:
+            return self.ocr_languages
+
+        languages = self.ocr_languages.split("+")
+        if sum(char.isalpha() for char in hint_text) >= MIN_TEXT_LAYER_CHARS:
+            scripts = detect_scripts(hint_text)
+            english = detect_language(hint_text) == "en"
+        else:
+            scripts = self._detect_script(
+                max(bands, key=lambda band: band.width * band.height)
+            )
+            english = False
+        if not scripts:
+            return self.ocr_languages
+
+        # English is always kept for the Latin words and digits of mixed pages
+        selected = [
+            language
+            for language in languages
+            if language == "eng"
+            or language not in OCR_LANGUAGE_SCRIPTS
+            or scripts.get(OCR_LANGUAGE_SCRIPTS[language], 0) >= MIN_OCR_SCRIPT_SHARE
+        ]
+        if english:
+            selected = [
+                language
+                for language in selected
+                if language == "eng" or OCR_LANGUAGE_SCRIPTS.get(language) != "LATIN"
+            ]
+        return "+".join(selected) or self.ocr_languages
+
+    @staticmethod
+    def _detect_script(image: Image.Image) -> dict[str, float]:
+        """Detects the dominant script of an image with Tesseract, {} if unknown."""
+        try:
+            osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+        except Exception:
+            return {}
+        return {osd["script"].upper(): 1.0}
+
+    def _text_bands(
+        self, page_number: int, region: fitz.Rect, masks: list[fitz.Rect]
+    ) -> list[Image.Image]:
+        """Renders a region of a page and crops it into bands of text.
+
+        The masked areas are painted white, then the raster is split at blank
+        horizontal gaps of at least `OCR_BAND_GAP` points into at most
+        `ocr_region_workers` bands, each cropped to its content, so Tesseract
+        never sees blank or masked pixels.
+        """
+        image = self._convert_page_to_images(page_number, clip=region)[0]
+        scale = self.ocr_dpi / 72
+
+        draw = ImageDraw.Draw(image)
+        for mask in masks:
+            overlap = mask & region
+            if not overlap.is_empty:
+                draw.rectangle(
+                    [
+                        (overlap.x0 - region.x0) * scale,
+                        (overlap.y0 - region.y0) * scale,
+                        (overlap.x1 - region.x0) * scale,
+                        (overlap.y1 - region.y0) * scale,
+                    ],
+                    fill="white",
+                )
+
+        # Rows and columns holding dark pixels
+        ink = np.asarray(image.convert("L")) < 200
+        rows = np.flatnonzero(ink.any(axis=1))
+        if not rows.size:
+            return []
+
+        # Runs of content rows separated by blank gaps, grouped into bands
+        # of similar height
+        runs = np.split(rows, np.flatnonzero(np.diff(rows) > OCR_BAND_GAP * scale) + 1)
+        band_height = (rows[-1] - rows[0]) / max(self.ocr_region_workers, 1)
+        groups = [[runs[0]]]
+        for run in runs[1:]:
+            if run[-1] - groups[-1][0][0] > band_height:
+                groups.append([])
+            groups[-1].append(run)
+
+        bands = []
+        padding = int(4 * scale)
+        for group in groups:
+            top, bottom = group[0][0], group[-1][-1]
+            columns = np.flatnonzero(ink[top : bottom + 1].any(axis=0))
+            bands.append(
+                image.crop(
+                    (
+                        max(columns[0] - padding, 0),
+                        max(top - padding, 0),
+                        min(columns[-1] + padding + 1, image.width),
+                        min(bottom + padding + 1, image.height),
+                    )
+                )
+            )
+        return bands
+
+    def _ocr_image(self, image: Image.Image, languages: Optional[str] = None) -> str:
+        """Runs Tesseract on an image, with `ocr_languages` unless given `languages`."""
+        return pytesseract.image_to_string(
+            image, lang=languages or self.ocr_languages
+        ).strip()
 
     def _extract_text_from_images(self, images: list) -> str:
         """Extracts text from images using OCR (supports Arabic and multiple languages)."""
-        return "\n".join(
-            pytesseract.image_to_string(
-                Image.open(img), lang=self.ocr_languages
+        with timed("ocr"):
+            return "\n".join(
+                pytesseract.image_to_string(img, lang=self.ocr_languages).strip()
+                for img in images
             ).strip()
-            for img in images
-        ).strip()
 
-    def _remove_fuzzy_match(self, tables: list, raw_text: str) -> list:
-        """Removes text that matches table content using fuzzy matching."""
-        # Split the raw text into rows based on new line characters
-        rows_of_text = raw_text.split("\n")
-
-        # Initialize lists to store cleaned and filtered text and table rows
-        cleaned_text_rows = []
-        filtered_text_rows = []
-        joined_table = []
-
-        # Clean up the text rows
-        for row in rows_of_text:
-            cleaned_text_rows.append(row.replace("|", ""))
-
-        # Convert the tables into a single list of strings
-        for row in tables[0]:
-            row = filter(None, row)
-            joined_table.append(" ".join(row))
-
-        # Find text rows that match table content using fuzzy matching
-        for clean_row in cleaned_text_rows:
-            for table_row in joined_table:
-                if SM(None, clean_row, table_row).ratio() > 0.7:
-                    filtered_text_rows.append(clean_row)
-                    break
-        # Return the cleaned text rows that do not match any table content
-        return "\n".join(
-            [item for item in cleaned_text_rows if item not in filtered_text_rows]
-        )
+    def _remove_table_text(self, tables: list, text: str) -> str:
+        """Removes the lines of OCR text that match a table row, if any."""
+        if not text or not tables:
+            return text
+        with timed("fuzzy_filter"):
+            return self._remove_fuzzy_match(tables=tables, raw_text=text)
 
-    def _initial_cleanup(self) -> None:
-        """Initial cleanup of temporary files."""
-
-        # Set the directory paths for temporary files
-        embedded_dir = r"backend/extracted_images/"
-        extracted_dir = r"backend/ocr_pdf/"
-        pdf_dir = r"backend/data/"
-
-        # Remove any existing temporary files prior to processing
-        for dir in [embedded_dir, extracted_dir]:
-            if os.path.exists(dir):
-                for file in os.listdir(dir):
-                    file_path = os.path.join(dir, file)
-                    if os.path.isfile(file_path):
-                        os.remove(file_path)
-
-    def _cleanup_images(self, images: list) -> None:
-        """Removes temporary image files after processing."""
-        for img_path in images:
-            if os.path.exists(img_path):
-                os.remove(img_path)
+    def _remove_fuzzy_match(self, tables: list, raw_text: str) -> str:
+        """Removes text that matches table content using fuzzy matching.
+
+        Text lines and the rows of every table are compared through their
+        character trigrams. The rows sharing a trigram with a line are looked
+        up in an inverted index and scored with the Dice coefficient, so each
+        line is only compared with the rows it overlaps.
+        """
+        # Index the trigrams of the rows of every table
+        row_shingles = []
+        rows_by_shingle = {}
+        for table in tables:
+            for row in table:
+                shingles = self._char_shingles(
+                    " ".join(str(cell) for cell in row if cell)
+                )
+                for shingle in shingles:
+                    rows_by_shingle.setdefault(shingle, []).append(len(row_shingles))
+                row_shingles.append(shingles)
+
+        # Keep the cleaned text rows that do not match any table row
+        kept_text_rows = []
+        for text_row in raw_text.split("\n"):
+            clean_row = text_row.replace("|", "")
+            shingles = self._char_shingles(clean_row)
+            shared = Counter(
+                row for shingle in shingles for row in rows_by_shingle.get(shingle, ())
+            )
+            if not any(
+                2 * count / (len(shingles) + len(row_shingles[row]))
+                > TABLE_TEXT_SIMILARITY
+                for row, count in shared.items()
+            ):
+                kept_text_rows.append(clean_row)
+        return "\n".join(kept_text_rows)
+
+    @staticmethod
+    def _char_shingles(text: str) -> set:
+        """Returns the character trigrams of a text, ignoring case and spacing."""
+        text = " ".join(text.lower().split())
+        if len(text) < 3:
+            return {text} if text else set()
+        return {text[i : i + 3] for i in range(len(text) - 2)}
 
     def get_page_data(self, page_number: int) -> dict:
         """
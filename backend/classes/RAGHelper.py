@@ -1,40 +1,183 @@
-from typing import List
+import contextvars
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
 import chromadb
 from langchain_core.documents import Document
 from langchain_chroma import Chroma
 from langchain_core.embeddings import Embeddings
+from openai import APIStatusError
 
 from .APIRouter import CLIENT
+from .BM25Index import BM25Index
+from .Metrics import record_cache, record_usage, timed
+
+
+# Number of texts per embeddings request and requests in flight at once
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+# Retries of a failed embeddings request, with the client's own backoff
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+
+# Number of query embeddings kept in memory
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+# Directory of the persistent vector database
+CHROMA_DIR = os.getenv("CHROMA_DIR", "backend/data/chroma")
+
+# Default retrieval mode: "hybrid", "vector" or "lexical"
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+
+# Rank constant of reciprocal rank fusion
+RRF_K = 60
 
 
 class NomicEmbeddings(Embeddings):
-    def __init__(self, model: str):
+    def __init__(
+        self,
+        model: str,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        query_cache_size: int = QUERY_EMBEDDING_CACHE_SIZE,
+    ):
         self.model = model
-        self.client = CLIENT
+        self.client = CLIENT.with_options(max_retries=max_retries)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()  # LRU of query text -> embedding
+        self._query_cache_lock = threading.Lock()
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Embed search docs."""
-        return [
-            self.client.embeddings.create(input=[_], model=self.model).data[0].embedding
-            for _ in texts
+        """Embed search docs.
+
+        Texts are sent in batches of `batch_size`, with up to `concurrency`
+        batches in flight. The embeddings are returned in the order of `texts`.
+        """
+        batches = [
+            texts[start : start + self.batch_size]
+            for start in range(0, len(texts), self.batch_size)
         ]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._embed_batch, batch)
+                for batch in batches
+            ]
+            return [
+                embedding for future in futures for embedding in future.result()
+            ]
 
     def embed_query(self, text: str) -> List[float]:
-        """Embed query text."""
-        return self.embed_documents([text])[0]
+        """Embed query text, reusing the embeddings of recent queries."""
+        with self._query_cache_lock:
+            hit = text in self._query_cache
+            if hit:
+                self._query_cache.move_to_end(text)
+                embedding = self._query_cache[text]
+        record_cache("query_embedding", hit)
+        if hit:
+            return embedding
+
+        embedding = self._embed_batch([text])[0]
+        with self._query_cache_lock:
+            self._query_cache[text] = embedding
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+        return embedding
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts.
+
+        Connection errors, timeouts, rate limits and server errors are retried
+        by the client and raised once the retries run out. A batch the server
+        rejects (an input too large, for instance) is split in half and each
+        half is embedded on its own, so one bad input does not fail the whole
+        ingest.
+        """
+        try:
+            with timed("embed"):
+                response = self.client.embeddings.create(input=texts, model=self.model)
+        except APIStatusError as e:
+            rejected = 400 <= e.status_code < 500 and e.status_code != 429
+            if not rejected or len(texts) == 1:
+                raise
+            print(f"[ERROR] Embedding batch of {len(texts)} rejected, splitting: {e}")
+            middle = len(texts) // 2
+            return self._embed_batch(texts[:middle]) + self._embed_batch(
+                texts[middle:]
+            )
+
+        record_usage(self.model, response.usage)
+        data = sorted(response.data, key=lambda item: item.index)
+        if len(data) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(data)}.")
+        return [item.embedding for item in data]
 
 
 class RAGHelper:
     """Helper for Retrieval Augmented Generation (RAG)."""
 
-    def __init__(self):
+    def __init__(self, persist_directory: str = CHROMA_DIR, warm_load: bool = True):
+        """Initialize the RAGHelper.
+
+        Parameters
+        ----------
+        persist_directory : str, optional
+            Directory of the persistent vector database, by default `CHROMA_DIR`.
+        warm_load : bool, optional
+            Load the vector database in a background thread, by default True.
+            Otherwise it is loaded on first use.
+        """
         self.message = "Hello World, I am a helper class for RAG."
-        embedding_function = NomicEmbeddings(
+        self.persist_directory = persist_directory
+        self.bm25_index = BM25Index()
+        self.embedding_function = NomicEmbeddings(
             model="text-embedding-nomic-embed-text-v1.5-embedding"
         )
-        chromadb.api.client.SharedSystemClient.clear_system_cache()  # Clear cache to handle "could not connect to tenant default_tenant" error
-        self.vectorstore = Chroma("all_documents", embedding_function)
+        self._vectorstore = None
+        self._load_lock = threading.Lock()
+        if warm_load:
+            threading.Thread(target=self._load_vectorstore, daemon=True).start()
+
+    @property
+    def vectorstore(self) -> Chroma:
+        """The vector database, waiting for the warm load if it is in progress."""
+        return self._vectorstore or self._load_vectorstore()
+
+    def _load_vectorstore(self) -> Chroma:
+        """Open the persistent vector database and load its index into memory.
+
+        The stored embeddings are reused as they are, so documents ingested
+        before a restart are queryable without calling the embedding model.
+        """
+        with self._load_lock:
+            if self._vectorstore is not None:
+                return self._vectorstore
+
+            with timed("vectorstore_load"):
+                chromadb.api.client.SharedSystemClient.clear_system_cache()  # Clear cache to handle "could not connect to tenant default_tenant" error
+                vectorstore = Chroma(
+                    "all_documents",
+                    self.embedding_function,
+                    persist_directory=self.persist_directory,
+                )
+
+                # Query with a stored embedding so the vector index is loaded now
+                # rather than on the first user query
+                stored = vectorstore.get(limit=1, include=["embeddings"])
+                if len(stored["ids"]):
+                    vectorstore._collection.query(
+                        query_embeddings=[list(stored["embeddings"][0])], n_results=1
+                    )
+
+            self._vectorstore = vectorstore
+            return vectorstore
 
     def get(self) -> str:
         return self.message
@@ -43,37 +186,155 @@ class RAGHelper:
         if self.vectorstore:
             return self.vectorstore.get()
 
-    def add_docs_to_chromadb(self, docs: list[dict]) -> None:
-        if self.vectorstore:
-            self.vectorstore.reset_collection()
+    def add_docs_to_chromadb(
+        self, docs: list[dict], doc_id: str, replace: bool = False
+    ) -> list[str]:
+        """Add the documents of a PDF to the vector database.
+
+        Every document is tagged with `doc_id` in its metadata, so several PDFs
+        can share the collection and be searched separately or together.
+
+        Parameters
+        ----------
+        docs : list[dict]
+            The documents with `page_content` and `metadata`.
+        doc_id : str
+            The ID of the PDF, e.g. the hash of its contents.
+        replace : bool, optional
+            Re-embed the PDF if it was already ingested, by default False.
+
+        Returns
+        -------
+        list[str]
+            The IDs of the added documents, empty if the PDF was already ingested.
+        """
+        self.bm25_index.add_document(doc_id, docs, replace=replace)
+
+        if self.has_document(doc_id):
+            if not replace:
+                return []
+            self.vectorstore.delete(
+                ids=self.vectorstore.get(where={"doc_id": doc_id}, include=[])["ids"]
+            )
 
         # Convert to Document type
         docs = [
-            Document(page_content=doc["page_content"], metadata=doc["metadata"])
+            Document(
+                page_content=doc["page_content"],
+                metadata={**doc["metadata"], "doc_id": doc_id},
+            )
             for doc in docs
         ]
-        return self.vectorstore.add_documents(docs)
+        ids = [f"{doc_id}:{idx}" for idx in range(len(docs))]
+        return self.vectorstore.add_documents(docs, ids=ids)
+
+    def has_document(self, doc_id: str) -> bool:
+        """Check whether a PDF has been ingested."""
+        return bool(self.vectorstore.get(where={"doc_id": doc_id}, limit=1)["ids"])
 
-    def retrieve_relevant_docs(self, user_query: str, top_k: int) -> list[Document]:
-        """Retrieve relevant documents from vector database based on user
-        query.
+    def delete_document(self, doc_id: str) -> int:
+        """Delete the documents of a PDF and return how many were deleted."""
+        ids = self.vectorstore.get(where={"doc_id": doc_id}, include=[])["ids"]
+        if ids:
+            self.vectorstore.delete(ids=ids)
+        self.bm25_index.delete_document(doc_id)
+        return len(ids)
+
+    def list_documents(self) -> list[str]:
+        """List the IDs of the ingested PDFs."""
+        metadatas = self.vectorstore.get(include=["metadatas"])["metadatas"]
+        return sorted(
+            {metadata["doc_id"] for metadata in metadatas if "doc_id" in metadata}
+        )
+
+    def retrieve_relevant_docs(
+        self,
+        user_query: str,
+        top_k: int,
+        doc_ids: Optional[list[str]] = None,
+        mode: Optional[str] = None,
+    ) -> list[Document]:
+        """Retrieve relevant documents based on user query.
 
         Parameters
         ----------
         user_query : str
             The user query or prompt in "Chat with Omni".
+        top_k : int
+            The number of documents to retrieve.
+        doc_ids : list[str], optional
+            Only search the documents of these PDFs, by default the whole library.
+        mode : str, optional
+            "vector" for embedding similarity, "lexical" for BM25 only (no
+            embedding call) or "hybrid" to fuse both with reciprocal rank
+            fusion, by default `RETRIEVAL_MODE`.
 
         Returns
         -------
-        pd.DataFrame
-            The DataFrame that contains the documents with relevance score.
+        list[Document]
+            The most relevant documents.
         """
+        with timed("retrieve"):
+            return self._retrieve(user_query, top_k, doc_ids, mode or RETRIEVAL_MODE)
+
+    def _retrieve(
+        self,
+        user_query: str,
+        top_k: int,
+        doc_ids: Optional[list[str]],
+        mode: str,
+    ) -> list[Document]:
+        """Retrieve the documents of `retrieve_relevant_docs` for a resolved mode."""
+        if mode == "vector":
+            return self._vector_search(user_query, top_k, doc_ids)
+
+        lexical_docs = [
+            Document(page_content=doc["page_content"], metadata=doc["metadata"])
+            for doc, _ in self.bm25_index.search(user_query, top_k, doc_ids)
+        ]
+        if mode == "lexical":
+            return lexical_docs
+        if mode != "hybrid":
+            raise ValueError(f"Unknown retrieval mode: {mode}")
 
-        # Read vector database as DataFrame
-        results = self.vectorstore.similarity_search(
+        vector_docs = self._vector_search(user_query, top_k, doc_ids)
+
+        # Reciprocal rank fusion of both rankings
+        scores, fused = {}, {}
+        for ranking in (vector_docs, lexical_docs):
+            for rank, doc in enumerate(ranking, start=1):
+                key = self._doc_key(doc)
+                scores[key] = scores.get(key, 0) + 1 / (RRF_K + rank)
+                fused.setdefault(key, doc)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return [fused[key] for key in ranked[:top_k]]
+
+    def _vector_search(
+        self, user_query: str, top_k: int, doc_ids: Optional[list[str]] = None
+    ) -> list[Document]:
+        """Retrieve the documents most similar to the user query."""
+
+        # Restrict the search to the requested PDFs
+        if not doc_ids:
+            doc_filter = None
+        elif len(doc_ids) == 1:
+            doc_filter = {"doc_id": doc_ids[0]}
+        else:
+            doc_filter = {"doc_id": {"$in": list(doc_ids)}}
+
+        return self.vectorstore.similarity_search(
             user_query,
             k=top_k,
+            filter=doc_filter,
         )
 
-        # Retrieve relevant docs
-        return results
+    @staticmethod
+    def _doc_key(doc: Document) -> tuple:
+        """Identify a document across rankings by its PDF and item key."""
+        return (
+            doc.metadata.get("doc_id"),
+            doc.metadata.get("text_chunk_key")
+            or doc.metadata.get("trans_table_summary_key")
+            or doc.metadata.get("image_caption_key"),
+        )
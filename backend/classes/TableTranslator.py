@@ -0,0 +1,131 @@
+import re
+import threading
+from concurrent.futures import Future
+from itertools import zip_longest
+from typing import Optional
+
+from openai import OpenAI
+
+from .APIRouter import translate_texts
+from .LanguageDetector import WORD_PATTERN, is_english
+
+
+# Cells that are kept as they are: amounts, percentages, numeric dates and
+# times, optionally with a short unit or currency such as "RM 1,200" or "12 kg"
+UNTRANSLATED_CELL = re.compile(
+    r"[^\w]*(?:[A-Za-z]{1,3}\.?\s?)?[-+(]?\d[\d\s.,:/()%-]*(?:\s?[A-Za-z]{1,3}\.?)?"
+)
+
+# Words that need no translation either: English month names, units,
+# magnitudes and currency codes, as in "12 Jan 2024" or "USD 5 million"
+UNTRANSLATED_WORDS = frozenset(
+    """
+    january february march april may june july august september october
+    november december jan feb mar apr jun jul aug sep sept oct nov dec am pm
+    mg g kg t ton tons tonnes mm cm m km ml l kwh mw sqft sqm pcs pc qty
+    unit units hr hrs hour hours min mins sec secs day days
+    thousand million billion mil mn bn k
+    rm myr usd sgd idr rp eur gbp
+    """.split()
+)
+
+
+class TableTranslator:
+    """Translates the tables of a document cell by cell.
+
+    The distinct cell strings of the tables are translated in batches with
+    `translate_texts` and the tables are rebuilt locally, so the model never
+    has to reproduce a table's structure. Cells without words (numbers,
+    amounts, dates) are kept as they are, and so are the columns detected as
+    English. A cell translated once is reused by every later table of the
+    document, including tables of pages being translated concurrently.
+    """
+
+    def __init__(self, client: OpenAI, skip_english: bool = True):
+        """
+        Initializes the TableTranslator.
+
+        Args:
+            client (OpenAI): Client used for the translation requests.
+            skip_english (bool, optional): Keep the columns detected as English (default: True).
+        """
+        self.client = client
+        self.skip_english = skip_english
+        self._translations = {}  # Translation of each cell string, as a Future
+        self._lock = threading.Lock()
+
+    def translate_tables(self, tables: list[list[list]]) -> list[list[list]]:
+        """Translates tables into English, keeping their rows and columns.
+
+        Args:
+            tables (list[list[list]]): Tables as nested lists of rows of cells.
+
+        Returns:
+            list[list[list]]: The translated tables.
+        """
+        cells = list(
+            dict.fromkeys(
+                text
+                for table in tables
+                for column in self._columns(table)
+                for text in column
+                if self.needs_translation(text)
+            )
+        )
+
+        with self._lock:
+            pending = [cell for cell in cells if cell not in self._translations]
+            for cell in pending:
+                self._translations[cell] = Future()
+
+        if pending:
+            try:
+                translations = translate_texts(pending, self.client)
+            except Exception as e:
+                # Fail the waiting tables and let later tables try again
+                with self._lock:
+                    for cell in pending:
+                        self._translations.pop(cell).set_exception(e)
+                raise
+            for cell, translation in zip(pending, translations):
+                self._translations[cell].set_result(translation.strip())
+
+        translations = {cell: self._translations[cell].result() for cell in cells}
+        return [
+            [
+                [translations.get(self._cell_text(cell), cell) for cell in row]
+                for row in table
+            ]
+            for table in tables
+        ]
+
+    @staticmethod
+    def needs_translation(text: Optional[str]) -> bool:
+        """Checks whether a cell holds words to translate."""
+        if not text or not any(char.isalpha() for char in text):
+            return False
+        if UNTRANSLATED_CELL.fullmatch(text):
+            return False
+        return not all(
+            word in UNTRANSLATED_WORDS for word in WORD_PATTERN.findall(text.lower())
+        )
+
+    def _columns(self, table: list[list]) -> list[tuple]:
+        """Returns the cell strings of each column of a table, leaving out the
+        columns detected as English when `skip_english` is set.
+
+        Columns are the groups of cells detected together since single cells
+        are often too short to tell their language.
+        """
+        columns = list(zip_longest(*(map(self._cell_text, row) for row in table)))
+        if not self.skip_english:
+            return columns
+        return [
+            column
+            for column in columns
+            if not is_english("\n".join(text for text in column if text))
+        ]
+
+    @staticmethod
+    def _cell_text(cell) -> Optional[str]:
+        return cell.strip() if isinstance(cell, str) else None
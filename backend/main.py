@@ -1,13 +1,32 @@
+import hashlib
+import json
 import os
+import re
 import shutil
 import tempfile
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
+from typing import Optional
 
-from classes.PDFProcessor import PDFProcessor
-from classes.RAGHelper import RAGHelper
-from classes.APIRouter import translate_text, rag_prompt, CLIENT
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+
+from classes.AnswerCache import AnswerCache
+from classes.BlobStore import BlobStore
+from classes.DocumentStore import DocumentStore
+from classes.JobManager import JobManager
+from classes.Metrics import METRICS
+from classes.PDFProcessor import PDFProcessor, shutdown_page_pool
+from classes.RAGHelper import RAGHelper, RETRIEVAL_MODE
+from classes.APIRouter import (
+    atranslate_text,
+    arag_prompt,
+    arag_prompt_stream,
+    ASYNC_CLIENT,
+    LLM_CACHE,
+)
 
 app = FastAPI()
 
@@ -21,6 +40,43 @@ app.add_middleware(
 )
 
 rag_helper = RAGHelper()
+answer_cache = AnswerCache(embed_query=rag_helper.embedding_function.embed_query)
+pdf_processor = None
+
+document_store = DocumentStore()
+blob_store = BlobStore()
+
+# Resume the jobs interrupted by the last shutdown
+job_manager = JobManager(document_store=document_store, blob_store=blob_store)
+job_manager.resume_jobs()
+
+
+@app.on_event("shutdown")
+def stop_page_pool():
+    """Stop the worker processes shared by parallel page processing."""
+    shutdown_page_pool()
+
+
+def requested_doc_ids(payload: dict):
+    """Get the documents a chat request is scoped to, None for the whole library."""
+    if payload.get("doc_ids"):
+        return payload["doc_ids"]
+    if payload.get("doc_id"):
+        return [payload["doc_id"]]
+    return None
+
+
+async def retrieve_context(prompt: str, num_docs: int, doc_ids, mode: str):
+    """Retrieve the documents relevant to a prompt and resolve their items.
+
+    Runs in the threadpool so embedding the query never blocks the event loop.
+    """
+
+    def retrieve():
+        rel_docs = rag_helper.retrieve_relevant_docs(prompt, num_docs, doc_ids, mode)
+        return rel_docs, document_store.resolve(rel_docs)
+
+    return await run_in_threadpool(retrieve)
 
 
 @app.post("/pdf_pages")
@@ -35,15 +91,18 @@ async def retrieve_pdf_pages(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Unsupported file format.")
 
     # Save uploaded file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as tmp:
-        tmp_path = tmp.name
-        file.file.seek(0)
-        with open(tmp_path, "wb") as out_file:
-            shutil.copyfileobj(file.file, out_file)
+    def save_upload():
+        with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as tmp:
+            file.file.seek(0)
+            shutil.copyfileobj(file.file, tmp)
+            return tmp.name
 
     try:
         global pdf_processor
-        pdf_processor = PDFProcessor(tmp_path)
+        tmp_path = await run_in_threadpool(save_upload)
+        pdf_processor = await run_in_threadpool(
+            PDFProcessor, tmp_path, blob_store=blob_store
+        )
         return {"num_pages": pdf_processor.get_pages()}
     except Exception as e:
         print(f"[ERROR] Getting PDF pages failed: {e}")
@@ -56,7 +115,9 @@ async def process_pdf(payload: dict):
 
     try:
         page_number = payload["page_number"]
-        pages_data, documents = pdf_processor.process_pdf_page(page_number)
+        pages_data, documents = await run_in_threadpool(
+            pdf_processor.process_pdf_page, page_number
+        )
         # print(pages_data, documents)
         return {"pages_data": pages_data, "documents": documents}
     except Exception as e:
@@ -65,9 +126,111 @@ async def process_pdf(payload: dict):
         raise HTTPException(status_code=500, detail="Failed to process PDF.")
 
 
+@app.post("/process_pdf_pages")
+async def process_pdf_pages(payload: dict = None):
+    """Process all PDF pages in parallel.
+
+    Pages are streamed back in page order as newline-delimited JSON, one line
+    per page, so the progress can be reported while the rest is processed.
+    """
+
+    payload = payload or {}
+    if pdf_processor is None:
+        raise HTTPException(status_code=400, detail="No PDF uploaded.")
+    num_pages = pdf_processor.get_pages()
+
+    def stream_pages():
+        pages = pdf_processor.process_pdf_pages(
+            llm_concurrency=payload.get("llm_concurrency")
+        )
+        try:
+            for completed, (pages_data, documents) in enumerate(pages, start=1):
+                yield json.dumps(
+                    {
+                        "completed": completed,
+                        "num_pages": num_pages,
+                        "pages_data": pages_data,
+                        "documents": documents,
+                    }
+                ) + "\n"
+        except Exception as e:
+            print(f"[ERROR] PDF processing failed: {e}")
+            yield json.dumps({"error": "Failed to process PDF."}) + "\n"
+        finally:
+            # Stop the remaining pages when the client disconnects
+            pages.close()
+
+    return StreamingResponse(stream_pages(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs")
+async def create_job(file: UploadFile = File(...)):
+    """Upload a PDF and process it in the background.
+
+    Returns the job status, whose `job_id` is used to poll the progress and
+    fetch the pages as they complete.
+    """
+
+    extension = os.path.splitext(file.filename)[1] or ".pdf"
+    if extension not in [".pdf"]:
+        raise HTTPException(status_code=400, detail="Unsupported file format.")
+
+    try:
+        return await run_in_threadpool(
+            job_manager.create_job, file.filename, file.file
+        )
+    except Exception as e:
+        print(f"[ERROR] Creating job failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to create job.")
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status of a processing job."""
+
+    try:
+        return job_manager.get_job(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+
+@app.get("/jobs/{job_id}/pages")
+async def get_job_pages(job_id: str, start: int = 0):
+    """Get the pages data and documents of the completed pages of a job.
+
+    `start` skips the pages the client has already fetched.
+    """
+
+    try:
+        return {"pages": await run_in_threadpool(job_manager.get_pages, job_id, start)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Stream the completed pages and final status of a job as server-sent events."""
+
+    try:
+        job_manager.get_job(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    def stream_events():
+        for event in job_manager.iter_events(job_id):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return StreamingResponse(stream_events(), media_type="text/event-stream")
+
+
 @app.post("/ingest")
 async def ingest_documents(payload: dict):
-    """Ingest Documents into the vector database."""
+    """Ingest Documents into the vector database.
+
+    Documents are stored under `doc_id` (the job's document hash), or a hash
+    of the documents when it is not given. A document that was already
+    ingested is not embedded again unless `replace` is set.
+    """
 
     try:
         docs = payload.get("documents")
@@ -75,14 +238,93 @@ async def ingest_documents(payload: dict):
         if not docs:
             raise HTTPException(status_code=400, detail="No Documents found.")
 
-        rag_helper.add_docs_to_chromadb(docs)
-
-        return {"message": "Documents ingested successfully."}
+        doc_id = payload.get("doc_id") or hashlib.sha256(
+            json.dumps(docs, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        if not re.fullmatch(r"[\w-]+", doc_id):
+            raise HTTPException(status_code=400, detail="Invalid document ID.")
+        ids = await run_in_threadpool(
+            rag_helper.add_docs_to_chromadb,
+            docs,
+            doc_id,
+            replace=payload.get("replace", False),
+        )
+
+        if not ids:
+            return {"message": "Documents already ingested.", "doc_id": doc_id}
+        answer_cache.invalidate(doc_id)
+        return {"message": "Documents ingested successfully.", "doc_id": doc_id}
     except Exception as e:
         print(f"[ERROR] Document ingestion failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to ingest documents.")
 
 
+@app.get("/documents")
+async def list_documents():
+    """List the IDs of the documents in the vector database."""
+
+    return {"doc_ids": await run_in_threadpool(rag_helper.list_documents)}
+
+
+@app.get("/documents/{doc_id}/index")
+async def get_document_index(doc_id: str):
+    """Get the key index of a processed document.
+
+    Maps every `text_chunk_key`, `trans_table_summary_key` and
+    `image_caption_key` to its page number and content, so clients can
+    resolve citations without scanning the pages data.
+    """
+
+    try:
+        index = await run_in_threadpool(document_store.get_index, doc_id)
+        return {"doc_id": doc_id, "index": index}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Document not found.")
+
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    """Delete a document from the vector database."""
+
+    deleted = await run_in_threadpool(rag_helper.delete_document, doc_id)
+    await run_in_threadpool(document_store.delete_document, doc_id)
+    answer_cache.invalidate(doc_id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return {"message": "Document deleted successfully.", "deleted": deleted}
+
+
+@app.get("/blobs/{blob_id}")
+async def get_blob(
+    blob_id: str,
+    size: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """Get an extracted image by its blob ID, or a JPEG thumbnail of it.
+
+    Blobs are content-addressed and never change, so responses are cacheable
+    forever and revalidated with their ETag.
+    """
+
+    etag = f'"{blob_id}"' if size is None else f'"{blob_id}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if not blob_store.has(blob_id):
+        raise HTTPException(status_code=404, detail="Blob not found.")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    if size is None:
+        media_type = await run_in_threadpool(blob_store.media_type, blob_id)
+        return FileResponse(
+            blob_store.path(blob_id), media_type=media_type, headers=headers
+        )
+    try:
+        path = await run_in_threadpool(blob_store.thumbnail, blob_id, size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+
 @app.post("/translate/")
 async def translate(payload: dict):
     """Translate vernacular text to English."""
@@ -93,7 +335,7 @@ async def translate(payload: dict):
         if not text:
             raise HTTPException(status_code=400, detail="No text found.")
 
-        translation = translate_text(text, CLIENT)
+        translation = await atranslate_text(text, ASYNC_CLIENT)
 
         return {"translation": translation}
     except Exception as e:
@@ -103,20 +345,131 @@ async def translate(payload: dict):
 
 @app.post("/rag_prompt/")
 async def rag(payload: dict):
-    """Create a new prompt with RAG and return enhanced answer."""
+    """Create a new prompt with RAG and return enhanced answer.
+
+    Answers to the same or a near-identical prompt about the same documents
+    are served from the answer cache unless `use_cache` is false.
+    """
 
     try:
         prompt = payload["prompt"]
         num_docs = payload["num_docs"]
-        pages_data = payload["pages_data"]
+        doc_ids = requested_doc_ids(payload)
+        mode = payload.get("retrieval_mode") or RETRIEVAL_MODE
+        use_cache = payload.get("use_cache", True)
 
         if not prompt:
             raise HTTPException(status_code=400, detail="No prompt found.")
 
-        rel_docs = rag_helper.retrieve_relevant_docs(prompt, num_docs)
-        ans, docs = rag_prompt(prompt, rel_docs, pages_data, CLIENT)
-
-        return {"ans": ans, "docs": docs}
+        cached = use_cache and await run_in_threadpool(
+            answer_cache.get, prompt, doc_ids, num_docs, mode
+        )
+        if cached:
+            return cached
+
+        rel_docs, items = await retrieve_context(prompt, num_docs, doc_ids, mode)
+        ans, docs, dropped = await arag_prompt(prompt, rel_docs, items, ASYNC_CLIENT)
+
+        answer = jsonable_encoder({"ans": ans, "docs": docs, "dropped": dropped})
+        if use_cache:
+            await run_in_threadpool(
+                answer_cache.set, prompt, doc_ids, num_docs, mode, answer
+            )
+        return answer
     except Exception as e:
         print(f"[ERROR] RAG prompt failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to RAG prompt.")
+
+
+@app.post("/rag_prompt_stream/")
+async def rag_stream(payload: dict):
+    """Create a new prompt with RAG and stream the enhanced answer.
+
+    Sent as server-sent events: a `citations` event with the documents used
+    as context and those dropped from it, a `token` event per generated
+    token, then a `done` event. A cached answer is sent as a single token.
+    Failures are sent as an `error` event followed by `done`.
+    """
+
+    prompt = payload.get("prompt")
+    if not prompt:
+        raise HTTPException(status_code=400, detail="No prompt found.")
+
+    try:
+        num_docs = payload["num_docs"]
+        doc_ids = requested_doc_ids(payload)
+        mode = payload.get("retrieval_mode") or RETRIEVAL_MODE
+        use_cache = payload.get("use_cache", True)
+
+        cached = use_cache and await run_in_threadpool(
+            answer_cache.get, prompt, doc_ids, num_docs, mode
+        )
+        if cached:
+            docs, dropped = cached["docs"], cached["dropped"]
+        else:
+            rel_docs, items = await retrieve_context(prompt, num_docs, doc_ids, mode)
+            tokens, docs, dropped = arag_prompt_stream(
+                prompt, rel_docs, items, ASYNC_CLIENT
+            )
+    except Exception as e:
+        print(f"[ERROR] RAG prompt failed: {e}")
+
+        async def stream_error():
+            yield f"event: error\ndata: {json.dumps('Failed to RAG prompt.')}\n\n"
+            yield "event: done\ndata: {}\n\n"
+
+        return StreamingResponse(stream_error(), media_type="text/event-stream")
+
+    async def stream_events():
+        citations = jsonable_encoder({"docs": docs, "dropped": dropped})
+        yield f"event: citations\ndata: {json.dumps(citations)}\n\n"
+        if cached:
+            yield f"event: token\ndata: {json.dumps(cached['ans'])}\n\n"
+            yield "event: done\ndata: {}\n\n"
+            return
+
+        ans = ""
+        try:
+            async for token in tokens:
+                ans += token
+                yield f"event: token\ndata: {json.dumps(token)}\n\n"
+            if use_cache:
+                await run_in_threadpool(
+                    answer_cache.set,
+                    prompt,
+                    doc_ids,
+                    num_docs,
+                    mode,
+                    {"ans": ans, **citations},
+                )
+        except Exception as e:
+            print(f"[ERROR] RAG prompt failed: {e}")
+            yield f"event: error\ndata: {json.dumps('Failed to RAG prompt.')}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(stream_events(), media_type="text/event-stream")
+
+
+@app.get("/llm_cache")
+async def llm_cache_stats():
+    """Get the hit/miss counters and size of the model response cache."""
+
+    if LLM_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **LLM_CACHE.stats()}
+
+
+@app.get("/answer_cache")
+async def answer_cache_stats():
+    """Get the hit/miss counters and size of the chat answer cache."""
+
+    return {"enabled": answer_cache.enabled, **answer_cache.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Get the stage timings, token usage and cache hits in the Prometheus format."""
+
+    return PlainTextResponse(
+        METRICS.render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
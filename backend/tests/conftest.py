@@ -0,0 +1,19 @@
+import os
+import shutil
+import sys
+import tempfile
+
+# Tests import the backend the way main.py does, as `classes.<Module>`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The backend reads its settings on import: give the model clients a dummy
+# key, disable the LLM cache and keep the persisted data out of the tree
+DATA_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("LM_API_KEY", "test")
+os.environ["LLM_CACHE_PATH"] = ""
+for name in ("CHROMA_DIR", "BM25_DIR", "DOCUMENTS_DIR", "JOBS_DIR", "BLOBS_DIR"):
+    os.environ[name] = os.path.join(DATA_DIR, name.lower()[: -len("_dir")])
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
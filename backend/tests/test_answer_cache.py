@@ -0,0 +1,23 @@
+from classes.AnswerCache import AnswerCache
+
+
+def embed_query(prompt: str) -> list[float]:
+    """Embeds every prompt alike, so only the identifiers tell them apart."""
+    return [1.0, 0.0]
+
+
+def test_near_duplicate_with_same_identifiers_is_a_hit():
+    cache = AnswerCache(threshold=0.95, embed_query=embed_query)
+    cache.set("What is the total of INV-1001?", ["doc"], 5, "hybrid", {"answer": "10"})
+
+    assert cache.get("What's the total for INV-1001", ["doc"], 5, "hybrid") == {
+        "answer": "10"
+    }
+
+
+def test_near_duplicate_with_different_identifiers_is_a_miss():
+    cache = AnswerCache(threshold=0.95, embed_query=embed_query)
+    cache.set("What is the total of INV-1001?", ["doc"], 5, "hybrid", {"answer": "10"})
+
+    assert cache.get("What is the total of INV-1002?", ["doc"], 5, "hybrid") is None
+    assert cache.get("What was the revenue in 2023?", ["doc"], 5, "hybrid") is None
@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from classes.BM25Index import BM25Index
+
+
+def make_docs(content: str) -> list[dict]:
+    return [{"page_content": content, "metadata": {"page_number": 1}}]
+
+
+def test_concurrent_adds_of_the_same_document(tmp_path):
+    index = BM25Index(str(tmp_path))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [
+            executor.submit(index.add_document, "doc", make_docs("invoice total"))
+            for _ in range(50)
+        ]
+        for future in futures:
+            future.result()
+
+    assert [path.name for path in tmp_path.iterdir()] == ["doc.json"]
+    assert len(BM25Index(str(tmp_path)).search("invoice", top_k=5)) == 1
+
+
+def test_add_without_replace_keeps_the_first_index(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add_document("doc", make_docs("invoice total"))
+    index.add_document("doc", make_docs("revenue"), replace=False)
+
+    assert not index.search("revenue", top_k=5)
+    assert len(index.search("invoice", top_k=5)) == 1
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from classes.DocumentStore import DocumentStore
+
+
+def make_pages(content: str) -> list[dict]:
+    return [
+        {
+            "pages_data": {"page_number": 1},
+            "documents": [
+                {"page_content": content, "metadata": {"text_chunk_key": "text-1"}}
+            ],
+        }
+    ]
+
+
+def test_concurrent_adds_of_the_same_document(tmp_path):
+    store = DocumentStore(str(tmp_path))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [
+            executor.submit(store.add_document, "doc", make_pages(f"text {idx}"))
+            for idx in range(50)
+        ]
+        for future in futures:
+            future.result()
+
+    assert store.get_item("doc", "text-1")["type"] == "text"
+    assert [path.name for path in tmp_path.iterdir()] == ["doc.json"]
+
+
+def test_add_without_replace_keeps_the_first_index(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    store.add_document("doc", make_pages("first"))
+    store.add_document("doc", make_pages("second"), replace=False)
+
+    assert DocumentStore(str(tmp_path)).get_item("doc", "text-1")["content"] == "first"
@@ -0,0 +1,33 @@
+from classes.LLMCache import LLMCache
+
+
+def test_total_size_is_tracked_across_replacements_and_reopening(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    cache = LLMCache(db_path, max_bytes=100)
+    cache.set("a", "x" * 40)
+    cache.set("b", "x" * 40)
+    cache.set("a", "x" * 10)
+
+    assert cache.stats()["size_bytes"] == 50
+    assert LLMCache(db_path).stats()["size_bytes"] == 50
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), max_bytes=100, touch_interval=0)
+    cache.set("a", "x" * 40)
+    cache.set("b", "x" * 40)
+    assert cache.get("a") is not None
+    cache.set("c", "x" * 40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["size_bytes"] == 80
+
+
+def test_hits_within_the_touch_interval_dont_write(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), touch_interval=60)
+    cache.set("a", "value")
+    changes = cache._conn.total_changes
+
+    assert cache.get("a") == "value"
+    assert cache._conn.total_changes == changes
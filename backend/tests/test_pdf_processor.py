@@ -0,0 +1,47 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pdfplumber")
+pytest.importorskip("pytesseract")
+pytest.importorskip("openai")
+
+from classes import PDFProcessor as pdf_processor_module  # noqa: E402
+from classes.PDFProcessor import PDFProcessor  # noqa: E402
+
+TEXT = "Quarterly revenue grew in every region of the company this year."
+
+
+@pytest.fixture
+def searchable_scan(tmp_path):
+    """A page image with the same text under it as an invisible OCR layer."""
+    source = fitz.open()
+    page = source.new_page()
+    page.insert_text((72, 72), TEXT, fontsize=11)
+    pixmap = page.get_pixmap(dpi=100)
+
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=pixmap)
+    page.insert_text((72, 72), TEXT, fontsize=11, render_mode=3)
+
+    path = tmp_path / "searchable_scan.pdf"
+    doc.save(path)
+    return str(path)
+
+
+def test_searchable_scan_is_not_ocred_twice(searchable_scan, monkeypatch):
+    ocr_calls = []
+    monkeypatch.setattr(
+        pdf_processor_module.pytesseract,
+        "image_to_string",
+        lambda image, lang=None: ocr_calls.append(image) or TEXT,
+    )
+    processor = PDFProcessor(
+        searchable_scan, blob_store=object(), detect_languages=False
+    )
+
+    text, source = processor._extract_page_text(0)
+
+    assert source == "text_layer"
+    assert text.count("Quarterly revenue") == 1
+    assert not ocr_calls
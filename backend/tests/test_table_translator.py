@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("PIL")
+
+from classes.TableTranslator import TableTranslator  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "1,200.50",
+        "12%",
+        "RM 1,200",
+        "5 kg",
+        "12 Jan 2024",
+        "1 January 2024",
+        "Mar 2023",
+        "3.5 hours",
+        "USD 5 million",
+        "12 kg/m2",
+    ],
+)
+def test_numbers_dates_and_units_are_kept(text):
+    assert not TableTranslator.needs_translation(text)
+
+
+@pytest.mark.parametrize(
+    "text", ["Jumlah pendapatan", "12 Ogos 2024", "5 buah", "Jan Kowalski"]
+)
+def test_words_are_translated(text):
+    assert TableTranslator.needs_translation(text)
@@ -1,11 +1,9 @@
-import base64
-import io
 import os
+import time
 from itertools import cycle  # For displaying images in columns
 
 import streamlit as st
 import requests
-from PIL import Image
 
 from classes.WordCloudGenerator import WordCloudGenerator
 from classes.TableDataProcessor import TableDataProcessor
@@ -34,6 +32,7 @@ def download_pdf_data(
             page_data,
             all_text,
             all_text_translated,
+            load_image=lambda blob_id: fetch_blob(BACKEND_URL, blob_id),
         )
         with open(f"{zipped_folderpath}.zip", "rb") as f:
             st.download_button(
@@ -46,6 +45,7 @@ def download_pdf_data(
 
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://omnipdf-backend:8003")
+JOB_POLL_INTERVAL = 1  # Seconds between job status checks
 
 
 def main():
@@ -76,31 +76,52 @@ def main():
             # Initialize progress bar
             progress_bar = st.progress(0, "Processing PDF")
 
-            # Retrieve PDF pages
-            response = requests.post(
-                f"{BACKEND_URL}/pdf_pages",
-                files={"file": ("pdf", file_bytes, uploaded_file.type)},
+            # Start a background processing job for the PDF
+            job = requests.post(
+                f"{BACKEND_URL}/jobs",
+                files={"file": (uploaded_file.name, file_bytes, uploaded_file.type)},
             ).json()
-            num_pages = response["num_pages"]
-
-            # Get pages data and documents for each page
-            for page_number in range(num_pages):
-                response = requests.post(
-                    f"{BACKEND_URL}/process_pdf_page",
-                    json={"page_number": page_number},
-                ).json()
+            job_id = job["job_id"]
+            st.session_state.JOB_ID = job_id
+            st.session_state.DOC_ID = job["doc_id"]
+
+            # Poll the job and fetch pages data and documents as pages complete
+            while job["status"] not in ("completed", "failed"):
+                time.sleep(JOB_POLL_INTERVAL)
+                job = requests.get(f"{BACKEND_URL}/jobs/{job_id}").json()
+                pages = requests.get(
+                    f"{BACKEND_URL}/jobs/{job_id}/pages",
+                    params={"start": len(st.session_state.PAGES_DATA)},
+                ).json()["pages"]
 
                 # Update pages data and documents in session state
-                st.session_state.PAGES_DATA.append(response["pages_data"])
-                st.session_state.DOCUMENTS.extend(response["documents"])
+                for page in pages:
+                    st.session_state.PAGES_DATA.append(page["pages_data"])
+                    st.session_state.DOCUMENTS.extend(page["documents"])
 
                 # Update progress bar
-                prog = (page_number + 1) / num_pages
-                if page_number == num_pages:
-                    prog = 1
-                progress_bar.progress(
-                    prog, f"{page_number + 1}/{num_pages} Page Processed"
-                )
+                num_pages = job["num_pages"]
+                if num_pages:
+                    completed = len(st.session_state.PAGES_DATA)
+                    progress_bar.progress(
+                        completed / num_pages,
+                        f"{completed}/{num_pages} Page Processed",
+                    )
+
+            if job["status"] == "failed":
+                # Never ingest a partial document, it would be kept for good
+                # since later uploads of the same PDF are "already ingested"
+                st.error(f"Failed to process PDF: {job['error']}")
+                del st.session_state.pdf_file  # Process it again on re-upload
+                st.stop()
+
+            # Fetch the key index of the document, used to resolve citations
+            response = requests.get(
+                f"{BACKEND_URL}/documents/{st.session_state.DOC_ID}/index"
+            )
+            st.session_state.KEY_INDEX = (
+                response.json()["index"] if response.ok else {}
+            )
 
             st.session_state.ALL_TEXT = "".join(
                 [page.get("text", "") for page in st.session_state.PAGES_DATA]
@@ -115,7 +136,10 @@ def main():
             # Insert the Documents as embeddings to the vector database
             _ = requests.post(
                 f"{BACKEND_URL}/ingest",
-                json={"documents": st.session_state.DOCUMENTS},
+                json={
+                    "documents": st.session_state.DOCUMENTS,
+                    "doc_id": st.session_state.DOC_ID,
+                },
             )
 
         original_pdf_column, functionalities_column = st.columns(2)
@@ -175,69 +199,63 @@ def main():
                                 with st.chat_message(message["role"]):
                                     st.markdown(message["content"])
 
-                        # Create new prompt and get enhanced answer with RAG
+                        # Create new prompt and stream the enhanced answer with RAG
                         response = requests.post(
-                            f"{BACKEND_URL}/rag_prompt",
+                            f"{BACKEND_URL}/rag_prompt_stream",
                             json={
                                 "prompt": prompt,
                                 "num_docs": num_docs,
-                                "pages_data": st.session_state.PAGES_DATA,
+                                "doc_id": st.session_state.DOC_ID,
                             },
-                        ).json()
-                        ans = response["ans"]
-                        docs = response["docs"]
+                            stream=True,
+                        )
+                        # Citations, sent before the answer tokens
+                        docs, dropped = [], []
+
+                        def stream_answer():
+                            for event, data in iter_sse_events(response):
+                                if event == "citations":
+                                    docs.extend(data["docs"])
+                                    dropped.extend(data["dropped"])
+                                elif event == "token":
+                                    yield data
+                                elif event == "error":
+                                    st.error(data)
+
+                        # Render the answer as the tokens arrive
+                        stream_placeholder = st.empty()
+                        with stream_placeholder.container():
+                            with st.chat_message("assistant"):
+                                ans = st.write_stream(stream_answer())
+                        stream_placeholder.empty()
 
                         # Craft the response with citations
-                        if len(docs) < num_docs:
+                        if any(doc["reason"] == "budget" for doc in dropped):
                             ans += f"\n\n **References (truncated)**"
                         else:
                             ans += f"\n\n **References**"
 
-                        # Compile citations
+                        # Compile citations from the document's key index
+                        key_index = st.session_state.KEY_INDEX
                         for doc in docs:
+                            metadata = doc.get("metadata")
                             # Text documents
-                            if doc.get("metadata").get("type") == "text":
-                                text_chunk_key = doc.get("metadata").get(
-                                    "text_chunk_key"
-                                )
+                            if metadata.get("type") == "text":
+                                text_chunk_key = metadata.get("text_chunk_key")
                                 key_parts = text_chunk_key.split("_")
                                 ans += f"\n- [Text Chunk found on page {key_parts[-2]}](#{text_chunk_key})"
                             # Table documents
-                            elif doc.get("metadata").get("type") == "table":
-                                found = False
-                                for page in st.session_state.PAGES_DATA:
-                                    for trans_table_summary in page.get(
-                                        "translated_tables_summary", []
-                                    ):
-                                        if trans_table_summary["key"] == doc.get(
-                                            "metadata"
-                                        ).get("trans_table_summary_key"):
-                                            table_key = doc.get("metadata").get(
-                                                "trans_table_summary_key"
-                                            )
-                                            summary = trans_table_summary["summary"]
-                                            ans += f"\n- [Table found on page {page.get('page_number')}](#{table_key})"
-                                            found = True
-                                            break
-                                    if found:
-                                        break
+                            elif metadata.get("type") == "table":
+                                table_key = metadata.get("trans_table_summary_key")
+                                table = key_index.get(table_key)
+                                if table:
+                                    ans += f"\n- [Table found on page {table['page_number']}](#{table_key})"
                             # Image documents
-                            elif doc.get("metadata").get("type") == "image":
-                                found = False
-                                for page in st.session_state.PAGES_DATA:
-                                    for image in page.get("images", []):
-                                        if image["key"] == doc.get("metadata").get(
-                                            "image_caption_key"
-                                        ):
-                                            img_key = doc.get("metadata").get(
-                                                "image_caption_key"
-                                            )
-                                            caption = image["caption"]
-                                            ans += f"\n- [Image found on page {page.get('page_number')}](#{img_key})"
-                                            found = True
-                                            break
-                                    if found:
-                                        break
+                            elif metadata.get("type") == "image":
+                                img_key = metadata.get("image_caption_key")
+                                image = key_index.get(img_key)
+                                if image:
+                                    ans += f"\n- [Image found on page {image['page_number']}](#{img_key})"
 
                         # Display answer response
                         st.session_state.messages.append(
@@ -320,9 +338,8 @@ def main():
                         f"Image {key.split('_')[-1]} found on page {key.split('_')[-2]}",
                         anchor=key,
                     )
-                    img_bytes = base64.b64decode(image.get("img_b64"))
-                    image = Image.open(io.BytesIO(img_bytes))
-                    col.image(image, caption=caption, width=360)
+                    img_bytes = fetch_blob(BACKEND_URL, image.get("blob_id"), size=512)
+                    col.image(img_bytes, caption=caption, width=360)
 
         with st.expander("View Text Chunks"):
             for document in st.session_state.DOCUMENTS:
@@ -1,9 +1,9 @@
-import base64
 import csv
 import json
 import os
 import shutil  # To move files
 import zipfile
+from typing import Callable
 
 
 class DataPreparer:
@@ -55,6 +55,7 @@ class DataPreparer:
         pdf_data: list[dict],
         all_text: str,
         all_text_translated: str,
+        load_image: Callable[[str], bytes],
     ) -> str:
         """Prepare the PDF data for download.
 
@@ -68,6 +69,8 @@ class DataPreparer:
             The concatenated string of all text in the PDF.
         all_text_translated : str
             The concatenated string of all translated text in the PDF.
+        load_image : Callable[[str], bytes]
+            Fetches the bytes of an image from the backend by its blob ID.
 
         Returns
         -------
@@ -113,16 +116,16 @@ class DataPreparer:
                 img_file_path = os.path.join(
                     self.tmp_work_dir, "images", image.get("img_filename")
                 )
-                img_b64 = image.get("img_b64")
+                blob_id = image.get("blob_id")
 
-                if img_b64:
-                    image_data = base64.b64decode(img_b64)
+                if blob_id:
+                    image_data = load_image(blob_id)
                     with open(img_file_path, "wb") as f:
                         f.write(image_data)
                 else:
                     continue
 
-        # Before saving the PDF data, exclude img_b64 and img_filepath
+        # Before saving the PDF data, exclude the backend image references
         clean_pdf_data = []
         for page in pdf_data:
             clean_page = dict(page)
@@ -133,7 +136,7 @@ class DataPreparer:
                     clean_image = {
                         k: v
                         for k, v in image.items()
-                        if k not in ("image_url", "img_b64")
+                        if k not in ("image_url", "img_b64", "url")
                     }
                     clean_page["images"].append(clean_image)
             clean_pdf_data.append(clean_page)
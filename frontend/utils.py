@@ -1,4 +1,8 @@
 import base64
+import json
+
+import requests
+import streamlit as st
 
 
 # @st.cache_data
@@ -9,3 +13,33 @@ def display_pdf(file):
 
     pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="800" type="application/pdf"></iframe>'
     return pdf_display
+
+
+def iter_sse_events(response):
+    """Parse a streamed server-sent events response into (event, data) pairs.
+
+    The data of each event is decoded from JSON.
+    """
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:") :].strip())
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def fetch_blob(backend_url: str, blob_id: str, size: int = None) -> bytes:
+    """Fetch an extracted image, or a thumbnail of it, from the backend blob store.
+
+    Blobs never change, so they are fetched once per session and cached.
+    """
+    response = requests.get(
+        f"{backend_url}/blobs/{blob_id}", params={"size": size} if size else None
+    )
+    response.raise_for_status()
+    return response.content